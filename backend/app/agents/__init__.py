@@ -1,4 +1,4 @@
-from typing import Dict, Type
+from typing import Any, Dict, Tuple, Type
 from app.agents.base import AIAgent
 from app.agents.openai_agent import OpenAIAgent
 from app.agents.anthropic_agent import AnthropicAgent
@@ -12,9 +12,12 @@ class AgentFactory:
         AIProvider.ANTHROPIC: AnthropicAgent,
     }
     
+    # Provider clients (and their HTTP connection pools) reused across agent instances
+    _client_cache: Dict[Tuple[AIProvider, str], Any] = {}
+    
     @classmethod
     def create_agent(
-        self, 
+        cls, 
         provider: AIProvider, 
         config: AgentConfig, 
         api_key: str
@@ -33,19 +36,27 @@ class AgentFactory:
         Raises:
             ValueError: If provider is not supported
         """
-        if provider not in self._agents:
+        agent_class = cls._agents.get(provider)
+        if agent_class is None:
             raise ValueError(f"Unsupported AI provider: {provider}")
         
-        agent_class = self._agents[provider]
-        return agent_class(config, api_key)
+        key = (provider, api_key)
+        client = cls._client_cache.get(key)
+        if client is None:
+            client = agent_class.build_client(api_key)
+            if client is None:
+                return agent_class(config, api_key)
+            cls._client_cache[key] = client
+        
+        return agent_class(config, api_key, client=client)
     
     @classmethod
-    def get_supported_providers(self) -> list[AIProvider]:
+    def get_supported_providers(cls) -> list[AIProvider]:
         """Get list of supported AI providers."""
-        return list(self._agents.keys())
+        return list(cls._agents.keys())
     
     @classmethod
-    def register_agent(self, provider: AIProvider, agent_class: Type[AIAgent]):
+    def register_agent(cls, provider: AIProvider, agent_class: Type[AIAgent]):
         """
         Register a new AI agent type.
         
@@ -53,4 +64,7 @@ class AgentFactory:
             provider: The AI provider enum
             agent_class: The agent class to register
         """
-        self._agents[provider] = agent_class
\ No newline at end of file
+        cls._agents[provider] = agent_class
+        # Clients built for a previously registered class may not fit the new one
+        for key in [key for key in cls._client_cache if key[0] == provider]:
+            del cls._client_cache[key]
\ No newline at end of file
@@ -1,162 +1,244 @@
 import anthropic
-from typing import List
-from datetime import datetime
-import uuid
-import re
-
-from app.agents.base import AIAgent
+import asyncio
+import logging
+import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timezone
+
+from app.agents.base import AIAgent, HTTP_LIMITS
+from app.agents.keywords import match_keywords
+from app.core.ids import uuid7
 from app.models import ChatMessage, ChatResponse, MessageRole, AgentConfig
-from app.services.context_store import retrieve_similar_context
+from app.services.context_store import retrieve_similar_context_cached
+
+logger = logging.getLogger(__name__)
+
+# Prompt-cache breakpoint marker for the Messages API
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class AnthropicAgent(AIAgent):
     """Anthropic Claude-powered support agent implementation (updated for Messages API)."""
 
-    def __init__(self, config: AgentConfig, api_key: str):
+    def __init__(
+        self,
+        config: AgentConfig,
+        api_key: str,
+        client: Optional[anthropic.AsyncAnthropic] = None
+    ):
         super().__init__(config)
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.client = client or self.build_client(api_key)
         self.model = config.model
 
-        # Define common confusion detection keywords
-        self.confusion_keywords = [
-            "help", "stuck", "error", "problem", "issue", "confused", "not working",
-            "broken", "can't", "unable", "difficulty", "trouble", "struggling",
-            "don't understand", "how do i", "where is", "can't find",
-            "doesn't work", "failed", "wrong", "incorrect", "bug"
-        ]
-
-        self.screen_share_triggers = [
-            "share your screen", "screen sharing", "show me your screen",
-            "can you share", "let me see", "visual guidance"
-        ]
+    @staticmethod
+    def build_client(api_key: str) -> anthropic.AsyncAnthropic:
+        """Create an Anthropic client with a pooled keep-alive HTTP connection."""
+        return anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS)
+        )
 
     async def generate_response(
         self,
-        messages: List[ChatMessage],
+        messages: List[Dict[str, Any]],
         user_message: str
     ) -> ChatResponse:
         """Generate response using Anthropic Claude (Messages API)."""
 
-        # Analyze confusion level
-        confusion_level = await self.analyze_confusion_level(user_message)
-        should_share = self.should_request_screen_share(confusion_level)
-
-        # Prepare system prompt
-        system_prompt = self.system_prompt or ""
-        # Attempt to retrieve relevant context (supabase) and prepend to system prompt
-        try:
-            context_docs = []
-            # run retrieval in a thread because retrieve_similar_context is sync
-            import asyncio
-            context_docs = await asyncio.to_thread(retrieve_similar_context, user_message, 3)
-            if context_docs:
-                context_block = "\n\nRelevant Context:\n" + "\n---\n".join(context_docs)
-                system_prompt = context_block + "\n\n" + system_prompt
-        except Exception as e:
-            # retrieval failure should not block response generation
-            print('Context retrieval failed:', e)
-        if should_share:
-            system_prompt += (
-                "\n\nThe user appears to be having difficulty. "
-                "Please politely suggest that they share their screen for visual assistance."
-            )
-
-        # Convert chat history to Anthropic-style message format
-        formatted_messages = []
-        for msg in messages:
-            role = "user" if msg.role == MessageRole.USER else "assistant"
-            formatted_messages.append({"role": role, "content": msg.content})
+        # Serve a cached answer to a near-identical question if available
+        cached_response, query_embedding = await self._get_cached_response(messages, user_message)
+        if cached_response:
+            return cached_response
 
-        # Append the current user message
-        formatted_messages.append({"role": "user", "content": user_message})
+        confusion_level, should_share, request = await self._prepare_request(messages, user_message)
 
         try:
             # Use Claude Messages API (new standard for 3.0+ models)
-            response = await self.client.messages.create(
-                model=self.model,
-                system=system_prompt,
-                max_tokens=self.config.max_tokens or 1000,
-                temperature=self.config.temperature or 0.7,
-                messages=formatted_messages,
-            )
+            response = await self.client.messages.create(**request)
 
             # Extract text from the response
             ai_message_content = ""
             if hasattr(response, "content") and len(response.content) > 0:
                 ai_message_content = response.content[0].text
 
-            ai_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                role=MessageRole.ASSISTANT,
-                content=ai_message_content,
-                timestamp=datetime.utcnow(),
-                metadata={
-                    "model": self.model,
-                    "confusion_level": confusion_level,
-                    "stop_reason": getattr(response, "stop_reason", None),
-                }
-            )
-
-            # Detect if the model itself suggests screen sharing
-            contains_screen_share_request = any(
-                trigger in ai_message_content.lower()
-                for trigger in self.screen_share_triggers
-            )
-
-            return ChatResponse(
-                message=ai_message,
-                conversation_id=str(uuid.uuid4()),
-                should_request_screen_share=should_share or contains_screen_share_request,
-                confidence_score=confusion_level,
+            return self._build_response(
+                ai_message_content,
+                confusion_level,
+                should_share,
+                getattr(response, "stop_reason", None),
+                query_embedding,
             )
 
         except Exception as e:
-            # Fallback response in case of API failure
-            fallback_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                role=MessageRole.ASSISTANT,
-                content=(
-                    "I'm sorry, I'm having trouble connecting to my AI service right now. "
-                    "Let me try to help you with a basic response. Could you please describe your issue in more detail?"
-                ),
-                timestamp=datetime.utcnow(),
-                metadata={"error": str(e), "fallback": True},
-            )
-
-            return ChatResponse(
-                message=fallback_message,
-                conversation_id=str(uuid.uuid4()),
-                should_request_screen_share=should_share,
-                confidence_score=confusion_level,
-            )
-
-    async def analyze_confusion_level(self, message: str) -> float:
-        """Analyze the user's message to determine confusion level."""
-        message_lower = message.lower()
-        confusion_score = 0.0
+            return self._fallback_response(e, confusion_level, should_share)
 
-        # Check for confusion keywords
-        keyword_matches = sum(1 for keyword in self.confusion_keywords if keyword in message_lower)
-        confusion_score += min(keyword_matches * 0.2, 0.6)
-
-        # Question marks
-        confusion_score += min(message.count("?") * 0.1, 0.2)
+    async def generate_response_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        user_message: str
+    ) -> AsyncIterator[Union[str, ChatResponse]]:
+        """Stream the response text from the Messages API as it is generated."""
 
-        # Emotional indicators
-        emotional_indicators = ["frustrated", "annoying", "hate", "terrible", "awful", "stupid"]
-        if any(word in message_lower for word in emotional_indicators):
-            confusion_score += 0.3
+        cached_response, query_embedding = await self._get_cached_response(messages, user_message)
+        if cached_response:
+            yield cached_response.message.content
+            yield cached_response
+            return
 
-        # Error patterns
-        error_patterns = [r"error\s+\d+", r"exception", r"failed", r"crash", r"freeze", r"hang"]
-        for pattern in error_patterns:
-            if re.search(pattern, message_lower):
-                confusion_score += 0.25
-                break
+        confusion_level, should_share, request = await self._prepare_request(messages, user_message)
 
-        # Negative words
-        negative_words = ["can't", "cannot", "unable", "doesn't", "won't", "isn't", "aren't"]
-        negative_count = sum(1 for word in negative_words if word in message_lower)
-        confusion_score += min(negative_count * 0.15, 0.3)
+        chunks: List[str] = []
+        try:
+            async with self.client.messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                final_message = await stream.get_final_message()
+        except Exception as e:
+            if chunks:
+                # Part of the reply has already been sent; let the caller handle it
+                raise
+            fallback = self._fallback_response(e, confusion_level, should_share)
+            yield fallback.message.content
+            yield fallback
+            return
+
+        yield self._build_response(
+            "".join(chunks),
+            confusion_level,
+            should_share,
+            getattr(final_message, "stop_reason", None),
+            query_embedding,
+        )
+
+    async def _prepare_request(
+        self,
+        messages: List[Dict[str, Any]],
+        user_message: str
+    ) -> Tuple[float, bool, Dict[str, Any]]:
+        """Score the user message and build the Messages API request for it.
+
+        Returns (confusion_level, should_share, request keyword arguments).
+        """
+
+        # Analyze confusion level while retrieving relevant context (supabase);
+        # repeated questions are served from the process-wide retrieval cache
+        confusion_level, context_docs = await asyncio.gather(
+            self.analyze_confusion_level(user_message),
+            retrieve_similar_context_cached(user_message, 3),
+            return_exceptions=True,
+        )
+        if isinstance(confusion_level, BaseException):
+            raise confusion_level
+        should_share = self.should_request_screen_share(confusion_level)
 
-        return min(max(confusion_score, 0.0), 1.0)
+        # The system prompt is identical on every turn and ends in a cache breakpoint, so
+        # Anthropic reuses the prefill of system + history. Per-turn retrieved context and
+        # instructions go into the new user turn, after the cached prefix
+        system_blocks = []
+        if self.system_prompt:
+            system_blocks.append({"type": "text", "text": self.system_prompt, "cache_control": CACHE_CONTROL})
+        turn_blocks = []
+        if isinstance(context_docs, BaseException):
+            # retrieval failure should not block response generation
+            logger.warning("Context retrieval failed: %s", context_docs)
+        elif context_docs:
+            turn_blocks.append({
+                "type": "text",
+                "text": "<context>\n" + "\n---\n".join(context_docs) + "\n</context>",
+            })
+        if should_share:
+            turn_blocks.append({
+                "type": "text",
+                "text": (
+                    "<instructions>The user appears to be having difficulty. "
+                    "Please politely suggest that they share their screen for visual assistance.</instructions>"
+                ),
+            })
+
+        # Chat history arrives already formatted; copy the list so the caller's is untouched
+        formatted_messages = list(messages)
+
+        # Cache the conversation history up to (not including) the new user message
+        if formatted_messages and formatted_messages[-1]["content"]:
+            formatted_messages[-1] = {
+                "role": formatted_messages[-1]["role"],
+                "content": [{
+                    "type": "text",
+                    "text": formatted_messages[-1]["content"],
+                    "cache_control": CACHE_CONTROL,
+                }],
+            }
+
+        # Append the current user message, preceded by this turn's context and instructions
+        if turn_blocks:
+            formatted_messages.append({
+                "role": "user",
+                "content": [*turn_blocks, {"type": "text", "text": user_message}],
+            })
+        else:
+            formatted_messages.append({"role": "user", "content": user_message})
+
+        request = {
+            "model": self.model,
+            "system": system_blocks,
+            "max_tokens": self.config.max_tokens or 1000,
+            "temperature": self._request_temperature(),
+            "messages": formatted_messages,
+        }
+        return confusion_level, should_share, request
+
+    def _build_response(
+        self,
+        ai_message_content: str,
+        confusion_level: float,
+        should_share: bool,
+        stop_reason: Optional[str],
+        query_embedding: Optional[List[float]]
+    ) -> ChatResponse:
+        """Wrap the model's reply in a ChatResponse and store it in the semantic cache."""
+        ai_message = ChatMessage(
+            id=uuid7().hex,
+            role=MessageRole.ASSISTANT,
+            content=ai_message_content,
+            timestamp=datetime.now(timezone.utc),
+            metadata={
+                "model": self.model,
+                "confusion_level": confusion_level,
+                "stop_reason": stop_reason,
+            }
+        )
+
+        # Detect if the model itself suggests screen sharing
+        ai_lower = ai_message_content.lower()
+        contains_screen_share_request = "screen_share" in match_keywords(ai_lower)
+
+        chat_response = ChatResponse(
+            message=ai_message,
+            conversation_id=uuid7().hex,
+            should_request_screen_share=should_share or contains_screen_share_request,
+            confidence_score=confusion_level,
+        )
+        self._cache_response(query_embedding, chat_response)
+
+        return chat_response
+
+    def _fallback_response(self, error: Exception, confusion_level: float, should_share: bool) -> ChatResponse:
+        """Fallback response in case of API failure."""
+        fallback_message = ChatMessage(
+            id=uuid7().hex,
+            role=MessageRole.ASSISTANT,
+            content=(
+                "I'm sorry, I'm having trouble connecting to my AI service right now. "
+                "Let me try to help you with a basic response. Could you please describe your issue in more detail?"
+            ),
+            timestamp=datetime.now(timezone.utc),
+            metadata={"error": str(error), "fallback": True},
+        )
+
+        return ChatResponse(
+            message=fallback_message,
+            conversation_id=uuid7().hex,
+            should_request_screen_share=should_share,
+            confidence_score=confusion_level,
+        )
@@ -1,6 +1,25 @@
+import hashlib
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from app.models import ChatMessage, ChatResponse, AgentConfig
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timezone
+
+import httpx
+
+from app.agents.keywords import ERROR_RE, match_keywords
+from app.models import ChatResponse, AgentConfig
+from app.core.config import settings
+from app.core.ids import uuid7
+from app.services.context_store import get_embedding_async
+from app.services.semantic_cache import semantic_cache
+
+# Number of previous messages embedded alongside the user message for cache lookups
+SEMANTIC_CACHE_CONTEXT_MESSAGES = 2
+
+# Connection pool limits for provider HTTP clients shared across agent instances
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# Sampling temperature sent when the agent config leaves it unset
+DEFAULT_TEMPERATURE = 0.7
 
 class AIAgent(ABC):
     """
@@ -11,18 +30,26 @@ class AIAgent(ABC):
     def __init__(self, config: AgentConfig):
         self.config = config
         self.system_prompt = config.system_prompt or self._get_default_system_prompt()
+        # Cached replies are only reused by agents with the same provider, model and prompt
+        self._semantic_cache_scope = (
+            config.provider,
+            config.model,
+            hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()
+        )
     
     @abstractmethod
     async def generate_response(
         self, 
-        messages: List[ChatMessage], 
+        messages: List[Dict[str, Any]], 
         user_message: str
     ) -> ChatResponse:
         """
         Generate a response to the user's message given the conversation history.
         
         Args:
-            messages: List of previous messages in the conversation
+            messages: Previous messages in the conversation, already formatted as
+                {"role": "user" | "assistant", "content": str} dicts. The dicts are
+                shared with the caller's history cache and must not be mutated.
             user_message: The current user message to respond to
             
         Returns:
@@ -30,10 +57,41 @@ class AIAgent(ABC):
         """
         pass
     
-    @abstractmethod
+    async def generate_response_stream(
+        self, 
+        messages: List[Dict[str, Any]], 
+        user_message: str
+    ) -> AsyncIterator[Union[str, ChatResponse]]:
+        """
+        Generate a response, yielding its text as the provider produces it.
+        
+        Args:
+            messages: Previous messages in the conversation, as for generate_response
+            user_message: The current user message to respond to
+            
+        Yields:
+            Text chunks of the reply, then the complete ChatResponse as the last item
+        
+        Agents without a streaming implementation yield the whole reply as one chunk.
+        """
+        response = await self.generate_response(messages, user_message)
+        if response.message.content:
+            yield response.message.content
+        yield response
+    
+    @staticmethod
+    def build_client(api_key: str) -> Any:
+        """
+        Create a provider client that can be shared by agents using the same API key.
+        
+        Agents that manage their own client can leave this returning None.
+        """
+        return None
+    
     async def analyze_confusion_level(self, message: str) -> float:
         """
         Analyze the user's message to determine if they need visual assistance.
+        Uses keyword matching and pattern recognition.
         
         Args:
             message: The user's message to analyze
@@ -41,7 +99,40 @@ class AIAgent(ABC):
         Returns:
             Float between 0.0 and 1.0 indicating confusion level (1.0 = needs screen share)
         """
-        pass
+        message_lower = message.lower()
+        
+        # Base confusion score
+        confusion_score = 0.0
+        
+        # One pass over the message for every keyword category
+        matches = match_keywords(message_lower)
+        
+        # Check for confusion keywords
+        keyword_matches = len(matches.get('confusion', ()))
+        confusion_score += min(keyword_matches * 0.2, 0.6)  # Max 0.6 from keywords
+        
+        # Check for question marks (indicates uncertainty)
+        question_marks = message_lower.count('?')
+        confusion_score += min(question_marks * 0.1, 0.2)  # Max 0.2 from questions
+        
+        # Check for emotional indicators
+        if matches.get('emotional'):
+            confusion_score += 0.3
+        
+        # Check for negative words
+        negative_count = len(matches.get('negative', ()))
+        confusion_score += min(negative_count * 0.15, 0.3)
+        
+        # Already at the maximum; skip the regex pass
+        if confusion_score >= 1.0:
+            return 1.0
+        
+        # Check for technical error patterns
+        if ERROR_RE.search(message_lower):
+            confusion_score += 0.25
+        
+        # Ensure score is between 0 and 1
+        return min(max(confusion_score, 0.0), 1.0)
     
     def _get_default_system_prompt(self) -> str:
         """Default system prompt for the support assistant."""
@@ -67,4 +158,65 @@ Be friendly, professional, and focused on solving the user's problems efficientl
         Returns:
             Boolean indicating if screen sharing should be requested
         """
-        return confusion_level >= threshold
\ No newline at end of file
+        return confusion_level >= threshold
+    
+    def _request_temperature(self) -> float:
+        """The temperature actually sent to the provider (0 is kept, unset falls back to the default)."""
+        if self.config.temperature is None:
+            return DEFAULT_TEMPERATURE
+        return self.config.temperature
+    
+    def _semantic_cache_active(self) -> bool:
+        """Only deterministic agents are cached unless explicitly allowed."""
+        if not settings.semantic_cache_enabled:
+            return False
+        return self._request_temperature() == 0 or settings.semantic_cache_nondeterministic
+    
+    async def _get_cached_response(
+        self, 
+        messages: List[Dict[str, Any]], 
+        user_message: str
+    ) -> Tuple[Optional[ChatResponse], Optional[List[float]]]:
+        """
+        Look up an earlier response to a semantically similar message.
+        
+        Args:
+            messages: Previous messages in the conversation, in provider format
+            user_message: The current user message
+            
+        Returns:
+            Tuple of (cached ChatResponse or None, query embedding or None).
+            The embedding is returned so a miss can be stored without re-embedding.
+        """
+        if not self._semantic_cache_active():
+            return None, None
+        
+        # Embed the tail of the conversation too so follow-ups like "how do I fix it?"
+        # only match answers given in the same context
+        tail = [msg["content"] for msg in messages[-SEMANTIC_CACHE_CONTEXT_MESSAGES:]]
+        try:
+            embedding = await get_embedding_async("\n".join(tail + [user_message]))
+        except Exception:
+            return None, None
+        if embedding is None:
+            return None, None
+        
+        hit = semantic_cache.get(
+            embedding,
+            threshold=settings.semantic_cache_threshold,
+            scope=self._semantic_cache_scope
+        )
+        if hit is None:
+            return None, embedding
+        
+        response = ChatResponse.model_validate(hit)
+        response.conversation_id = uuid7().hex
+        response.message.id = uuid7().hex
+        response.message.timestamp = datetime.now(timezone.utc)
+        response.message.metadata = {**(response.message.metadata or {}), "semantic_cache_hit": True}
+        return response, embedding
+    
+    def _cache_response(self, embedding: Optional[List[float]], response: ChatResponse):
+        """Store a successful response under its query embedding."""
+        if embedding is not None:
+            semantic_cache.set(embedding, response.model_dump(), scope=self._semantic_cache_scope)
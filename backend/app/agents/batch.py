@@ -0,0 +1,258 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.base import AIAgent
+from app.core.ids import uuid7
+from app.models import (
+    AIProvider, BatchJob, BatchStatus, ChatMessage, ChatRequest, ChatResponse, MessageRole
+)
+
+FALLBACK_CONTENT = (
+    "I'm sorry, I'm having trouble connecting to my AI service right now. "
+    "Let me try to help you with a basic response. Could you please describe your issue in more detail?"
+)
+
+# Per-request result of a provider batch: (confusion level, reply text, error)
+_BatchResult = Tuple[Optional[float], Optional[str], Optional[str]]
+
+
+class BatchProcessor:
+    """
+    Runs many independent, non-interactive chat requests through an agent.
+
+    When the provider supports it, requests are submitted through its batch API
+    (Anthropic Message Batches, OpenAI Batch API), which is cheaper and has higher
+    throughput than realtime calls but can take up to 24 hours. submit() returns
+    as soon as the batch is created, and fetch() reports its status and, once it
+    has ended, its responses. Otherwise requests are sent through the realtime
+    API with bounded concurrency and answered by submit() directly.
+
+    Each batch request's custom_id carries its position and confusion level, so
+    results can be rebuilt from the provider alone, by any worker, at any time.
+    """
+
+    def __init__(
+        self,
+        agent: AIAgent,
+        max_concurrency: int = 8,
+        use_batch_api: bool = True
+    ):
+        self.agent = agent
+        self.max_concurrency = max_concurrency
+        self.use_batch_api = use_batch_api
+
+    async def submit(self, requests: List[ChatRequest]) -> BatchJob:
+        """
+        Start generating a response for every request.
+
+        Args:
+            requests: Chat requests to answer, each without conversation history
+
+        Returns:
+            A completed BatchJob for realtime processing, or an in-progress one
+            whose batch_id can be passed to fetch() for a provider batch
+        """
+        provider = self.agent.config.provider
+        client = getattr(self.agent, "client", None)
+        if requests and self.use_batch_api and client is not None:
+            if provider == AIProvider.ANTHROPIC and hasattr(client.messages, "batches"):
+                return await self._submit_anthropic_batch(requests)
+            if provider == AIProvider.OPENAI and hasattr(client, "batches"):
+                return await self._submit_openai_batch(requests)
+
+        return BatchJob(
+            batch_id=uuid7().hex,
+            status=BatchStatus.COMPLETED,
+            responses=await self._process_concurrently(requests)
+        )
+
+    async def fetch(self, batch_id: str) -> BatchJob:
+        """
+        Get the status of a provider batch, with its responses once it has ended.
+
+        Raises:
+            ValueError: If the agent's provider has no batch API
+        """
+        provider = self.agent.config.provider
+        client = getattr(self.agent, "client", None)
+        if client is not None:
+            if provider == AIProvider.ANTHROPIC and hasattr(client.messages, "batches"):
+                return await self._fetch_anthropic_batch(batch_id)
+            if provider == AIProvider.OPENAI and hasattr(client, "batches"):
+                return await self._fetch_openai_batch(batch_id)
+        raise ValueError(f"{provider.value} batches are not supported")
+
+    async def _process_concurrently(self, requests: List[ChatRequest]) -> List[ChatResponse]:
+        """Fan requests out to the realtime API, at most max_concurrency at a time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(request: ChatRequest) -> ChatResponse:
+            async with semaphore:
+                response = await self.agent.generate_response([], request.message)
+            response.conversation_id = request.conversation_id or response.conversation_id
+            return response
+
+        return list(await asyncio.gather(*(run(request) for request in requests)))
+
+    async def _custom_ids(self, requests: List[ChatRequest]) -> List[str]:
+        """Encode each request's position and confusion level (in thousandths) as its custom_id."""
+        confusion_levels = await asyncio.gather(
+            *(self.agent.analyze_confusion_level(request.message) for request in requests)
+        )
+        return [f"{index}-{round(level * 1000)}" for index, level in enumerate(confusion_levels)]
+
+    @staticmethod
+    def _parse_custom_id(custom_id: str) -> Tuple[int, float]:
+        index, level = custom_id.split("-")
+        return int(index), int(level) / 1000
+
+    async def _submit_anthropic_batch(self, requests: List[ChatRequest]) -> BatchJob:
+        """Submit requests as one Anthropic Message Batch."""
+        custom_ids = await self._custom_ids(requests)
+        batch = await self.agent.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": custom_id,
+                    "params": {
+                        "model": self.agent.model,
+                        "system": self.agent.system_prompt,
+                        "max_tokens": self.agent.config.max_tokens or 1000,
+                        "temperature": self.agent._request_temperature(),
+                        "messages": [{"role": "user", "content": request.message}],
+                    },
+                }
+                for custom_id, request in zip(custom_ids, requests)
+            ]
+        )
+        return BatchJob(batch_id=batch.id, status=BatchStatus.IN_PROGRESS)
+
+    async def _fetch_anthropic_batch(self, batch_id: str) -> BatchJob:
+        client = self.agent.client
+        batch = await client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return BatchJob(batch_id=batch_id, status=BatchStatus.IN_PROGRESS)
+
+        results: Dict[int, _BatchResult] = {}
+        async for entry in await client.messages.batches.results(batch_id):
+            index, confusion_level = self._parse_custom_id(entry.custom_id)
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                content = message.content[0].text if message.content else ""
+                results[index] = (confusion_level, content, None)
+            else:
+                results[index] = (confusion_level, None, entry.result.type)
+
+        # Size by the batch's own counts so requests missing from the results still get a fallback
+        counts = batch.request_counts
+        total = sum(
+            getattr(counts, name, 0) or 0
+            for name in ("processing", "succeeded", "errored", "canceled", "expired")
+        )
+        return BatchJob(
+            batch_id=batch_id,
+            status=BatchStatus.COMPLETED,
+            responses=self._build_responses(results, max(total, max(results, default=-1) + 1), batch_id)
+        )
+
+    async def _submit_openai_batch(self, requests: List[ChatRequest]) -> BatchJob:
+        """Submit requests as one OpenAI Batch API job."""
+        client = self.agent.client
+        custom_ids = await self._custom_ids(requests)
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.agent.model,
+                    "messages": [
+                        {"role": "system", "content": self.agent.system_prompt},
+                        {"role": "user", "content": request.message},
+                    ],
+                    "max_tokens": self.agent.config.max_tokens,
+                    "temperature": self.agent._request_temperature(),
+                },
+            })
+            for custom_id, request in zip(custom_ids, requests)
+        ]
+        input_file = await client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return BatchJob(batch_id=batch.id, status=BatchStatus.IN_PROGRESS)
+
+    async def _fetch_openai_batch(self, batch_id: str) -> BatchJob:
+        client = self.agent.client
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            return BatchJob(batch_id=batch_id, status=BatchStatus.IN_PROGRESS)
+
+        # Successful requests are in the output file and failed ones in the error file
+        results: Dict[int, _BatchResult] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            output = await client.files.content(file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                index, confusion_level = self._parse_custom_id(entry["custom_id"])
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                    results[index] = (confusion_level, content, None)
+                else:
+                    results[index] = (confusion_level, None, str(entry.get("error") or response.get("status_code")))
+
+        # Requests that never ran (e.g. the batch expired) appear in neither file
+        counts = getattr(batch, "request_counts", None)
+        total = max(getattr(counts, "total", 0) or 0, max(results, default=-1) + 1)
+        return BatchJob(
+            batch_id=batch_id,
+            status=BatchStatus.COMPLETED if batch.status == "completed" else BatchStatus.FAILED,
+            responses=self._build_responses(results, total, batch_id)
+        )
+
+    def _build_responses(
+        self,
+        results: Dict[int, _BatchResult],
+        total: int,
+        batch_id: str
+    ) -> List[ChatResponse]:
+        """Turn batch results into ChatResponses in request order, falling back for failed requests."""
+        now = datetime.now(timezone.utc)
+        responses = []
+        for index in range(total):
+            confusion_level, content, error = results.get(index, (None, None, "missing result"))
+            metadata: Dict[str, Any] = {
+                "model": self.agent.model,
+                "confusion_level": confusion_level,
+                "batch_id": batch_id,
+            }
+            if content is None:
+                content = FALLBACK_CONTENT
+                metadata.update({"error": error, "fallback": True})
+
+            responses.append(ChatResponse(
+                message=ChatMessage(
+                    id=uuid7().hex,
+                    role=MessageRole.ASSISTANT,
+                    content=content,
+                    timestamp=now,
+                    metadata=metadata
+                ),
+                conversation_id=uuid7().hex,
+                should_request_screen_share=(
+                    confusion_level is not None and self.agent.should_request_screen_share(confusion_level)
+                ),
+                confidence_score=confusion_level
+            ))
+        return responses
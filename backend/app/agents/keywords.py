@@ -0,0 +1,69 @@
+import re
+from typing import Dict, FrozenSet, Set
+
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None  # pyahocorasick optional; keyword matching falls back to substring scans
+
+# Technical error patterns ("error 404", "exception", ...) compiled into one alternation
+ERROR_RE = re.compile(r'error\s+\d+|exception|failed|crash|freeze|hang')
+
+# Keywords that indicate user confusion or need for visual help
+CONFUSION_KEYWORDS = frozenset({
+    'help', 'stuck', 'error', 'problem', 'issue', 'confused', 'not working',
+    'broken', "can't", 'unable', 'difficulty', 'trouble', 'struggling',
+    "don't understand", 'how do i', 'where is', "can't find",
+    "doesn't work", 'failed', 'wrong', 'incorrect', 'bug'
+})
+
+# Screen sharing trigger phrases
+SCREEN_SHARE_TRIGGERS = frozenset({
+    'share your screen', 'screen sharing', 'show me your screen',
+    'can you share', 'let me see', 'visual guidance'
+})
+
+EMOTIONAL_INDICATORS = frozenset({'frustrated', 'annoying', 'hate', 'terrible', 'awful', 'stupid'})
+
+NEGATIVE_WORDS = frozenset({"can't", 'cannot', 'unable', "doesn't", "won't", "isn't", "aren't"})
+
+# Every keyword mapped to the categories it scores in
+_KEYWORD_CATEGORIES: Dict[str, FrozenSet[str]] = {
+    word: frozenset(
+        category
+        for category, words in (
+            ('confusion', CONFUSION_KEYWORDS),
+            ('emotional', EMOTIONAL_INDICATORS),
+            ('negative', NEGATIVE_WORDS),
+            ('screen_share', SCREEN_SHARE_TRIGGERS),
+        )
+        if word in words
+    )
+    for word in CONFUSION_KEYWORDS | EMOTIONAL_INDICATORS | NEGATIVE_WORDS | SCREEN_SHARE_TRIGGERS
+}
+
+# Single automaton, built once per process, so a message is scanned once for all keyword categories
+_AUTOMATON = None
+if ahocorasick:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _word, _categories in _KEYWORD_CATEGORIES.items():
+        _AUTOMATON.add_word(_word, (_categories, _word))
+    _AUTOMATON.make_automaton()
+
+
+def match_keywords(text_lower: str) -> Dict[str, Set[str]]:
+    """Return the distinct keywords found in lowercased text, grouped by category."""
+    if _AUTOMATON is not None:
+        hits = (value for _, value in _AUTOMATON.iter(text_lower))
+    else:
+        hits = (
+            (categories, word)
+            for word, categories in _KEYWORD_CATEGORIES.items()
+            if word in text_lower
+        )
+
+    matches: Dict[str, Set[str]] = {}
+    for categories, word in hits:
+        for category in categories:
+            matches.setdefault(category, set()).add(word)
+    return matches
@@ -1,67 +1,47 @@
 import openai
-from typing import List
-from datetime import datetime
-import uuid
-import re
+import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timezone
 
-from app.agents.base import AIAgent
+from app.agents.base import AIAgent, HTTP_LIMITS
+from app.agents.keywords import match_keywords
+from app.core.ids import uuid7
 from app.models import ChatMessage, ChatResponse, MessageRole, AgentConfig
 
 class OpenAIAgent(AIAgent):
     """OpenAI GPT-powered support agent implementation."""
     
-    def __init__(self, config: AgentConfig, api_key: str):
+    def __init__(
+        self, 
+        config: AgentConfig, 
+        api_key: str, 
+        client: Optional[openai.AsyncOpenAI] = None
+    ):
         super().__init__(config)
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.client = client or self.build_client(api_key)
         self.model = config.model
-        
-        # Keywords that indicate user confusion or need for visual help
-        self.confusion_keywords = [
-            'help', 'stuck', 'error', 'problem', 'issue', 'confused', 'not working',
-            'broken', 'can\'t', 'unable', 'difficulty', 'trouble', 'struggling',
-            'don\'t understand', 'how do i', 'where is', 'can\'t find',
-            'doesn\'t work', 'failed', 'wrong', 'incorrect', 'bug'
-        ]
-        
-        # Screen sharing trigger phrases
-        self.screen_share_triggers = [
-            'share your screen', 'screen sharing', 'show me your screen',
-            'can you share', 'let me see', 'visual guidance'
-        ]
+    
+    @staticmethod
+    def build_client(api_key: str) -> openai.AsyncOpenAI:
+        """Create an OpenAI client with a pooled keep-alive HTTP connection."""
+        return openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS)
+        )
     
     async def generate_response(
         self, 
-        messages: List[ChatMessage], 
+        messages: List[Dict[str, Any]], 
         user_message: str
     ) -> ChatResponse:
         """Generate response using OpenAI GPT."""
         
-        # Analyze confusion level
-        confusion_level = await self.analyze_confusion_level(user_message)
-        should_share = self.should_request_screen_share(confusion_level)
-        
-        # Convert our messages to OpenAI format
-        openai_messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
-        
-        # Add conversation history
-        for msg in messages:
-            openai_messages.append({
-                "role": msg.role.value,
-                "content": msg.content
-            })
-        
-        # Add current user message
-        openai_messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        # Serve a cached answer to a near-identical question if available
+        cached_response, query_embedding = await self._get_cached_response(messages, user_message)
+        if cached_response:
+            return cached_response
         
-        # If we should request screen sharing, modify the system prompt
-        if should_share:
-            screen_share_instruction = "\n\nThe user appears to be having difficulty. Please ask them to share their screen so you can provide visual guidance. Be polite and explain that screen sharing will help you understand their issue better."
-            openai_messages[0]["content"] += screen_share_instruction
+        confusion_level, should_share, openai_messages = await self._prepare_messages(messages, user_message)
         
         try:
             # Call OpenAI API
@@ -69,100 +49,147 @@ class OpenAIAgent(AIAgent):
                 model=self.model,
                 messages=openai_messages,
                 max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature
-            )
-            
-            ai_message_content = response.choices[0].message.content
-            
-            # Create response message
-            ai_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                role=MessageRole.ASSISTANT,
-                content=ai_message_content,
-                timestamp=datetime.utcnow(),
-                metadata={
-                    "model": self.model,
-                    "confusion_level": confusion_level,
-                    "token_usage": {
-                        "prompt_tokens": response.usage.prompt_tokens,
-                        "completion_tokens": response.usage.completion_tokens,
-                        "total_tokens": response.usage.total_tokens
-                    }
-                }
+                temperature=self._request_temperature()
             )
             
-            # Check if the response contains screen sharing request
-            contains_screen_share_request = any(
-                trigger in ai_message_content.lower() 
-                for trigger in self.screen_share_triggers
-            )
-            
-            return ChatResponse(
-                message=ai_message,
-                conversation_id=str(uuid.uuid4()),
-                should_request_screen_share=should_share or contains_screen_share_request,
-                confidence_score=confusion_level
+            return self._build_response(
+                response.choices[0].message.content,
+                confusion_level,
+                should_share,
+                {
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                    "total_tokens": response.usage.total_tokens
+                },
+                query_embedding
             )
             
         except Exception as e:
-            # Fallback response in case of API error
-            fallback_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                role=MessageRole.ASSISTANT,
-                content="I'm sorry, I'm having trouble connecting to my AI service right now. Let me try to help you with a basic response. Could you please describe your issue in more detail?",
-                timestamp=datetime.utcnow(),
-                metadata={"error": str(e), "fallback": True}
-            )
-            
-            return ChatResponse(
-                message=fallback_message,
-                conversation_id=str(uuid.uuid4()),
-                should_request_screen_share=should_share,
-                confidence_score=confusion_level
+            return self._fallback_response(e, confusion_level, should_share)
+    
+    async def generate_response_stream(
+        self, 
+        messages: List[Dict[str, Any]], 
+        user_message: str
+    ) -> AsyncIterator[Union[str, ChatResponse]]:
+        """Stream the response text from OpenAI as it is generated."""
+        
+        cached_response, query_embedding = await self._get_cached_response(messages, user_message)
+        if cached_response:
+            yield cached_response.message.content
+            yield cached_response
+            return
+        
+        confusion_level, should_share, openai_messages = await self._prepare_messages(messages, user_message)
+        
+        chunks: List[str] = []
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=openai_messages,
+                max_tokens=self.config.max_tokens,
+                temperature=self._request_temperature(),
+                stream=True
             )
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            if chunks:
+                # Part of the reply has already been sent; let the caller handle it
+                raise
+            fallback = self._fallback_response(e, confusion_level, should_share)
+            yield fallback.message.content
+            yield fallback
+            return
+        
+        # Streamed completions don't report token usage
+        yield self._build_response("".join(chunks), confusion_level, should_share, None, query_embedding)
     
-    async def analyze_confusion_level(self, message: str) -> float:
+    async def _prepare_messages(
+        self, 
+        messages: List[Dict[str, Any]], 
+        user_message: str
+    ) -> Tuple[float, bool, List[Dict[str, Any]]]:
         """
-        Analyze user message to determine confusion level.
-        Uses keyword matching and pattern recognition.
+        Score the user message and build the chat completion messages for it.
+        
+        Returns (confusion_level, should_share, OpenAI messages).
         """
-        message_lower = message.lower()
-        
-        # Base confusion score
-        confusion_score = 0.0
-        
-        # Check for confusion keywords
-        keyword_matches = sum(1 for keyword in self.confusion_keywords if keyword in message_lower)
-        confusion_score += min(keyword_matches * 0.2, 0.6)  # Max 0.6 from keywords
-        
-        # Check for question marks (indicates uncertainty)
-        question_marks = message.count('?')
-        confusion_score += min(question_marks * 0.1, 0.2)  # Max 0.2 from questions
-        
-        # Check for emotional indicators
-        emotional_indicators = ['frustrated', 'annoying', 'hate', 'terrible', 'awful', 'stupid']
-        if any(indicator in message_lower for indicator in emotional_indicators):
-            confusion_score += 0.3
-        
-        # Check for technical error patterns
-        error_patterns = [
-            r'error\s+\d+',  # "error 404", "error 500", etc.
-            r'exception',
-            r'failed',
-            r'crash',
-            r'freeze',
-            r'hang'
-        ]
+        # Analyze confusion level
+        confusion_level = await self.analyze_confusion_level(user_message)
+        should_share = self.should_request_screen_share(confusion_level)
         
-        for pattern in error_patterns:
-            if re.search(pattern, message_lower):
-                confusion_score += 0.25
-                break
+        # System prompt, then the already formatted conversation history,
+        # then the current user message. The system prompt is never modified so the
+        # prompt prefix stays identical across turns and OpenAI can cache it
+        openai_messages = [
+            {"role": "system", "content": self.system_prompt},
+            *messages
+        ]
         
-        # Check for negative words
-        negative_words = ["can't", "cannot", "unable", "doesn't", "won't", "isn't", "aren't"]
-        negative_count = sum(1 for word in negative_words if word in message_lower)
-        confusion_score += min(negative_count * 0.15, 0.3)
+        # If we should request screen sharing, add the instruction for this turn only
+        if should_share:
+            screen_share_instruction = "The user appears to be having difficulty. Please ask them to share their screen so you can provide visual guidance. Be polite and explain that screen sharing will help you understand their issue better."
+            openai_messages.append({"role": "system", "content": screen_share_instruction})
         
-        # Ensure score is between 0 and 1
-        return min(max(confusion_score, 0.0), 1.0)
\ No newline at end of file
+        openai_messages.append({"role": "user", "content": user_message})
+        return confusion_level, should_share, openai_messages
+    
+    def _build_response(
+        self, 
+        ai_message_content: str, 
+        confusion_level: float, 
+        should_share: bool, 
+        token_usage: Optional[Dict[str, int]], 
+        query_embedding: Optional[List[float]]
+    ) -> ChatResponse:
+        """Wrap the model's reply in a ChatResponse and store it in the semantic cache."""
+        metadata = {
+            "model": self.model,
+            "confusion_level": confusion_level
+        }
+        if token_usage is not None:
+            metadata["token_usage"] = token_usage
+        
+        # Create response message
+        ai_message = ChatMessage(
+            id=uuid7().hex,
+            role=MessageRole.ASSISTANT,
+            content=ai_message_content,
+            timestamp=datetime.now(timezone.utc),
+            metadata=metadata
+        )
+        
+        # Check if the response contains screen sharing request
+        ai_lower = ai_message_content.lower()
+        contains_screen_share_request = 'screen_share' in match_keywords(ai_lower)
+        
+        chat_response = ChatResponse(
+            message=ai_message,
+            conversation_id=uuid7().hex,
+            should_request_screen_share=should_share or contains_screen_share_request,
+            confidence_score=confusion_level
+        )
+        self._cache_response(query_embedding, chat_response)
+        
+        return chat_response
+    
+    def _fallback_response(self, error: Exception, confusion_level: float, should_share: bool) -> ChatResponse:
+        """Fallback response in case of API error."""
+        fallback_message = ChatMessage(
+            id=uuid7().hex,
+            role=MessageRole.ASSISTANT,
+            content="I'm sorry, I'm having trouble connecting to my AI service right now. Let me try to help you with a basic response. Could you please describe your issue in more detail?",
+            timestamp=datetime.now(timezone.utc),
+            metadata={"error": str(error), "fallback": True}
+        )
+        
+        return ChatResponse(
+            message=fallback_message,
+            conversation_id=uuid7().hex,
+            should_request_screen_share=should_share,
+            confidence_score=confusion_level
+        )
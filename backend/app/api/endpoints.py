@@ -2,30 +2,46 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from pydantic import BaseModel
 import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from app.services import context_store
 
 from app.models import (
-    ChatRequest, ChatResponse, ConversationHistory, 
+    BatchJob, ChatRequest, ChatResponse, ConversationHistory, 
     AIProvider, AgoraTokenRequest, AgoraTokenResponse
 )
 from app.services.chat import chat_service
 from app.services.agora import agora_service
+from app.services.ocr_cache import ocr_cache
 from pathlib import Path
 import os
+import hashlib
 from fastapi import File, UploadFile
-from fastapi.responses import JSONResponse
-from PIL import Image
-import io
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import uuid
 try:
+    import cv2
     import pytesseract
     _HAS_TESSERACT = True
 except Exception:
     _HAS_TESSERACT = False
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Screenshots whose pixel standard deviation is below this are treated as blank
+BLANK_IMAGE_STD = 5.0
+
+# Dedicated, bounded pool for OCR. pytesseract runs tesseract as a subprocess and
+# OpenCV releases the GIL, so threads run OCR in parallel without pickling images
+_ocr_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='ocr')
+
 
 class DocIngestRequest(BaseModel):
     title: Optional[str] = None
@@ -44,10 +60,65 @@ async def send_message(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/stream")
+async def stream_message(request: ChatRequest):
+    """
+    Send a message to the AI assistant and stream the reply as server-sent events.
+    
+    Each text chunk is sent as a `data: {"delta": ...}` event as soon as the
+    provider produces it; the complete ChatResponse follows as a `done` event.
+    """
+    async def events():
+        try:
+            async for item in chat_service.stream_message(
+                message=request.message,
+                conversation_id=request.conversation_id,
+                user_id=request.user_id
+            ):
+                if isinstance(item, ChatResponse):
+                    yield f"event: done\ndata: {item.model_dump_json()}\n\n"
+                else:
+                    yield f"data: {json.dumps({'delta': item})}\n\n"
+        except Exception as e:
+            logger.error('[Chat stream] Error: %s', e)
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    # Disable proxy buffering so chunks reach the client as they are sent
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch", response_model=BatchJob)
+async def send_batch(requests: List[ChatRequest]):
+    """
+    Answer a batch of independent messages, using the provider's batch API when available.
+    
+    Provider batches can take up to 24 hours, so they return at once with status
+    in_progress; poll GET /batch/{batch_id} for the responses.
+    """
+    try:
+        return await chat_service.process_batch(requests)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batch/{batch_id}", response_model=BatchJob)
+async def get_batch(batch_id: str):
+    """Get the status of a provider batch, with its responses once it has ended."""
+    try:
+        return await chat_service.get_batch(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/conversation/{conversation_id}", response_model=ConversationHistory)
 async def get_conversation(conversation_id: str):
     """Get conversation history by ID."""
-    conversation = chat_service.get_conversation(conversation_id)
+    conversation = await chat_service.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -105,6 +176,37 @@ async def health_check():
     }
 
 
+def _run_ocr(file_path: str) -> str:
+    """Preprocess a saved screenshot and extract its text with tesseract."""
+    # Decode once with OpenCV; all preprocessing runs as vectorized native code
+    # 1. IMREAD_COLOR always yields a 3-channel (BGR) image
+    image = cv2.imread(file_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f'Could not decode image {file_path}')
+    # Blank (near-uniform) screenshots have no text; skip the tesseract run
+    if float(image.std()) < BLANK_IMAGE_STD:
+        return ''
+    # 2. Upscale if small (tesseract works better on larger images)
+    height, width = image.shape[:2]
+    if width < 800 or height < 600:
+        scale_factor = max(2, min(int(800 / width), int(600 / height)))
+        new_size = (width * scale_factor, height * scale_factor)
+        image = cv2.resize(image, new_size, interpolation=cv2.INTER_LANCZOS4)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[OCR] Upscaled image from %s to %s', (width, height), new_size)
+    # 3. Enhance contrast: stretch 1.5x around the mean intensity
+    image = cv2.addWeighted(image, 1.5, image, 0, -0.5 * float(image.mean()))
+    # Sharpen with an unsharp mask (2x original minus its blur)
+    blur = cv2.GaussianBlur(image, (0, 0), 1.0)
+    image = cv2.addWeighted(image, 2.0, blur, -1.0, 0)
+    # 4. Run OCR with optimized settings (tesseract expects RGB)
+    # PSM modes: 3=auto, 6=assume single uniform block of text, 11=sparse text
+    config = r'--psm 3 --oem 3'  # PSM 3 (auto layout), OEM 3 (both neural and classic)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    ocr_text = pytesseract.image_to_string(image, config=config)
+    return ocr_text.strip() if ocr_text else ''
+
+
 @router.post('/screenshots')
 async def upload_screenshot(file: UploadFile = File(...)):
     """Receive a screenshot upload, save it, run OCR if available, and return a URL + extracted text."""
@@ -118,49 +220,37 @@ async def upload_screenshot(file: UploadFile = File(...)):
         filename = f"screenshot_{uuid.uuid4().hex}{ext}"
         file_path = uploads_dir / filename
 
-        contents = await file.read()
-        file_path.write_bytes(contents)
+        # Stream the upload to disk rather than holding the whole image in memory,
+        # hashing the content on the way for the OCR cache
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'wb') as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+                digest.update(chunk)
 
         ocr_text = None
         if _HAS_TESSERACT:
             try:
-                image = Image.open(io.BytesIO(contents))
-                # Preprocess image for better OCR
-                # 1. Convert to RGB if needed
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                # 2. Upscale if small (tesseract works better on larger images)
-                width, height = image.size
-                if width < 800 or height < 600:
-                    scale_factor = max(2, min(int(800 / width), int(600 / height)))
-                    new_size = (width * scale_factor, height * scale_factor)
-                    image = image.resize(new_size, Image.Resampling.LANCZOS)
-                    print(f'[OCR] Upscaled image from {(width, height)} to {image.size}')
-                # 3. Enhance contrast
-                from PIL import ImageEnhance
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.5)
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(2.0)
-                # 4. Run OCR with optimized settings
-                # PSM modes: 3=auto, 6=assume single uniform block of text, 11=sparse text
-                config = r'--psm 3 --oem 3'  # PSM 3 (auto layout), OEM 3 (both neural and classic)
-                ocr_text = pytesseract.image_to_string(image, config=config)
-                if ocr_text:
-                    ocr_text = ocr_text.strip()
-                print(f'[OCR] Extracted {len(ocr_text)} characters')
+                # OCR is CPU-heavy and blocking; keep it off the event loop, and
+                # reuse the result when the same image was uploaded before
+                loop = asyncio.get_running_loop()
+                ocr_text = await ocr_cache.get_or_compute(
+                    digest.hexdigest(),
+                    lambda: loop.run_in_executor(_ocr_pool, _run_ocr, str(file_path))
+                )
+                logger.debug('[OCR] Extracted %d characters', len(ocr_text))
             except Exception as e:
-                print(f'[OCR] Failed: {e}')
+                logger.warning('[OCR] Failed: %s', e)
                 ocr_text = None
 
         # Build a simple URL to the saved file (served from /uploads)
         file_url = f"/uploads/{filename}"
 
         # Return the actual filesystem path for debugging (so we can tell where it went)
-        return JSONResponse({"success": True, "url": file_url, "ocr_text": ocr_text, "path": str(file_path)})
+        return ORJSONResponse({"success": True, "url": file_url, "ocr_text": ocr_text, "path": str(file_path)})
 
     except Exception as e:
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+        return ORJSONResponse({"success": False, "error": str(e)}, status_code=500)
 
 
 @router.post('/transcribe')
@@ -174,7 +264,7 @@ async def transcribe_audio(file: UploadFile = File(...)):
         
         DEEPGRAM_API_KEY = os.environ.get('DEEPGRAM_API_KEY')
         if not DEEPGRAM_API_KEY:
-            return JSONResponse({"success": False, "error": "Deepgram API key not configured"}, status_code=400)
+            return ORJSONResponse({"success": False, "error": "Deepgram API key not configured"}, status_code=400)
         
         # Read audio file
         contents = await file.read()
@@ -194,14 +284,14 @@ async def transcribe_audio(file: UploadFile = File(...)):
                 if response.results.channels[0].alternatives:
                     transcript = response.results.channels[0].alternatives[0].transcript
             
-            return JSONResponse({"success": True, "transcript": transcript})
+            return ORJSONResponse({"success": True, "transcript": transcript})
         except Exception as e:
-            print(f'[Deepgram STT] Transcription error: {e}')
-            return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+            logger.error('[Deepgram STT] Transcription error: %s', e)
+            return ORJSONResponse({"success": False, "error": str(e)}, status_code=500)
             
     except Exception as e:
-        print(f'[Deepgram STT] Setup error: {e}')
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+        logger.error('[Deepgram STT] Setup error: %s', e)
+        return ORJSONResponse({"success": False, "error": str(e)}, status_code=500)
 
 
 class TTSRequest(BaseModel):
@@ -247,11 +337,11 @@ async def text_to_speech(payload: TTSRequest):
             # Return audio stream
             return StreamingResponse(audio_buffer, media_type="audio/mpeg")
         except Exception as e:
-            print(f'[Deepgram TTS] Generation error: {e}')
+            logger.error('[Deepgram TTS] Generation error: %s', e)
             raise HTTPException(status_code=500, detail=str(e))
             
     except Exception as e:
-        print(f'[Deepgram TTS] Setup error: {e}')
+        logger.error('[Deepgram TTS] Setup error: %s', e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -270,6 +360,6 @@ async def ingest_doc(payload: DocIngestRequest):
     try:
         # context_store.ingest_text is synchronous — run in a thread
         ok = await asyncio.to_thread(context_store.ingest_text, full_text)
-        return JSONResponse({"success": bool(ok)})
+        return ORJSONResponse({"success": bool(ok)})
     except Exception as e:
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
\ No newline at end of file
+        return ORJSONResponse({"success": False, "error": str(e)}, status_code=500)
\ No newline at end of file
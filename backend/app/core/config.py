@@ -1,18 +1,7 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
-from pathlib import Path
 from app.models import AIProvider
 
-# Explicitly load .env from backend directory
-try:
-    from dotenv import load_dotenv
-    backend_dir = Path(__file__).resolve().parents[2]  # app/core/config.py -> backend/
-    env_file = backend_dir / '.env'
-    if env_file.exists():
-        load_dotenv(env_file)
-except Exception as e:
-    print(f'Warning: Could not load .env with dotenv: {e}')
-
 class Settings(BaseSettings):
     """Application settings with environment variable support."""
     
@@ -30,6 +19,28 @@ class Settings(BaseSettings):
     default_anthropic_model: str = "claude-3-sonnet-20240229"
     ai_temperature: float = 0.7
     ai_max_tokens: int = 1000
+    ai_use_batch_api: bool = True
+    ai_batch_max_concurrency: int = 8
+    
+    # Semantic response cache (only used for deterministic agents unless
+    # semantic_cache_nondeterministic is set)
+    semantic_cache_enabled: bool = True
+    semantic_cache_nondeterministic: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_ttl: int = 3600
+    semantic_cache_max_entries: int = 1024
+    
+    # Redis (optional shared cache; everything stays in-process when unset)
+    redis_url: Optional[str] = None
+    
+    # Screenshot OCR cache
+    ocr_cache_max_entries: int = 512
+    ocr_cache_ttl: int = 86400
+    
+    # Conversation history (in-process LRU; persisted to Redis when enabled)
+    conversation_cache_max_entries: int = 10000
+    conversation_ttl: int = 86400
+    conversation_use_redis: bool = False
     
     # API settings
     api_host: str = "0.0.0.0"
@@ -46,7 +57,7 @@ class Settings(BaseSettings):
     
     # Pydantic v2 configuration: read .env and ignore extra env vars
     model_config = {
-        "env_file": None,  # env vars already loaded via load_dotenv above
+        "env_file": None,  # backend/.env is loaded into os.environ once, by app.main
         "env_file_encoding": "utf-8",
         "extra": "ignore",
     }
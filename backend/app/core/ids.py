@@ -0,0 +1,22 @@
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUID (version 7, RFC 9562).
+
+    The leading 48 bits are the Unix timestamp in milliseconds, so IDs sort by
+    creation time and keep index inserts in databases/KV stores append-mostly.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76                            # version
+        | (rand >> 62 & 0xFFF) << 64           # rand_a
+        | 0b10 << 62                           # variant
+        | rand & 0x3FFF_FFFF_FFFF_FFFF         # rand_b
+    )
+    return uuid.UUID(int=value)
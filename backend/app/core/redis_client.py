@@ -0,0 +1,18 @@
+from typing import Optional
+
+try:
+    import redis.asyncio as aioredis
+except Exception:
+    aioredis = None  # redis optional; caches stay in-process without it
+
+from app.core.config import settings
+
+_client: Optional["aioredis.Redis"] = None
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """Get the shared async Redis client, or None if Redis is not configured."""
+    global _client
+    if _client is None and aioredis and settings.redis_url:
+        _client = aioredis.from_url(settings.redis_url, decode_responses=True)
+    return _client
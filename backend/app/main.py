@@ -9,20 +9,29 @@ try:
 except Exception as e:
     print(f'Warning: Could not load .env: {e}')
 
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from app.api.endpoints import router
 from app.core.config import settings
 
+# Application logging (DEBUG adds per-request diagnostics such as OCR details).
+# Third-party libraries stay at WARNING so httpx & co. don't log every request.
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("app").setLevel(logging.DEBUG if settings.debug else logging.INFO)
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Support Assistant API",
     description="Backend API for AI-powered customer support with screen sharing",
     version="1.0.0",
     docs_url="/docs" if settings.debug else None,
-    redoc_url="/redoc" if settings.debug else None
+    redoc_url="/redoc" if settings.debug else None,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime
 
@@ -15,6 +16,41 @@ class ChatMessage(BaseModel):
     timestamp: Optional[datetime] = None
     metadata: Optional[Dict[str, Any]] = None
 
+@dataclass(slots=True, frozen=True, kw_only=True)
+class StoredMessage:
+    """
+    A message kept in a conversation's history.
+    
+    Conversations can hold many messages, so they are stored as slotted
+    dataclasses rather than pydantic models; they serialize to the same JSON
+    as ChatMessage, and are converted with to_message() where a ChatMessage
+    is needed.
+    """
+    id: Optional[str] = None
+    role: MessageRole
+    content: str
+    timestamp: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
+    
+    @classmethod
+    def from_message(cls, message: ChatMessage) -> "StoredMessage":
+        return cls(
+            id=message.id,
+            role=message.role,
+            content=message.content,
+            timestamp=message.timestamp,
+            metadata=message.metadata
+        )
+    
+    def to_message(self) -> ChatMessage:
+        return ChatMessage.model_construct(
+            id=self.id,
+            role=self.role,
+            content=self.content,
+            timestamp=self.timestamp,
+            metadata=self.metadata
+        )
+
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
@@ -26,10 +62,21 @@ class ChatResponse(BaseModel):
     should_request_screen_share: bool = False
     confidence_score: Optional[float] = None
 
+class BatchStatus(str, Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class BatchJob(BaseModel):
+    batch_id: str
+    status: BatchStatus
+    # Set once the batch has finished, in the same order as the submitted requests
+    responses: Optional[List[ChatResponse]] = None
+
 class ConversationHistory(BaseModel):
     conversation_id: str
     user_id: Optional[str] = None
-    messages: List[ChatMessage] = []
+    messages: List[StoredMessage] = []
     created_at: datetime
     updated_at: datetime
 
@@ -1,17 +1,33 @@
 from agora_token_builder import RtcTokenBuilder
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import re
 import time
 
 from app.models import AgoraTokenRequest, AgoraTokenResponse
 from app.core.config import settings
 
+# Agora channel name requirements:
+# - ASCII letters, numbers, underscore, hyphen
+# - 1-64 characters
+# \Z (not $) so a trailing newline can't slip through
+_CHANNEL_RE = re.compile(r'^[a-zA-Z0-9_-]{1,64}\Z')
+
+# Default token lifetime, and how long before expiry a cached token stops being handed out
+TOKEN_TTL = 24 * 3600
+TOKEN_REFRESH_MARGIN = 60
+# Cached tokens, one per (channel, uid, role)
+TOKEN_CACHE_SIZE = 1024
+
 class AgoraService:
     """Service for managing Agora tokens and screen sharing."""
     
     def __init__(self, app_id: str, app_certificate: str):
         self.app_id = app_id
         self.app_certificate = app_certificate
+        # (channel_name, uid, role) -> (token, privilege_expired_ts), least recently used first
+        self._token_cache: "OrderedDict[Tuple[str, int, int], Tuple[str, int]]" = OrderedDict()
     
     def generate_token(
         self, 
@@ -23,6 +39,10 @@ class AgoraService:
         """
         Generate Agora RTC token for screen sharing.
         
+        Tokens with the default expiration are cached per (channel, uid, role)
+        and reused until TOKEN_REFRESH_MARGIN seconds before they expire, so
+        clients re-requesting a token on reconnect don't rebuild it each time.
+        
         Args:
             channel_name: Name of the Agora channel
             uid: User ID (0 for auto-assignment)
@@ -35,9 +55,16 @@ class AgoraService:
         if not self.app_certificate:
             raise ValueError("Agora app certificate not configured")
         
-        # Default expiration time (24 hours from now)
+        key = None
         if privilege_expired_ts is None:
-            privilege_expired_ts = int(time.time()) + 24 * 3600
+            now = int(time.time())
+            key = (channel_name, uid, role)
+            cached = self._token_cache.get(key)
+            if cached and cached[1] - now > TOKEN_REFRESH_MARGIN:
+                self._token_cache.move_to_end(key)
+                return self._token_response(cached[0], channel_name, uid, cached[1])
+            # Default expiration time (24 hours from now)
+            privilege_expired_ts = now + TOKEN_TTL
         
         # Generate the token
         token = RtcTokenBuilder.buildTokenWithUid(
@@ -49,6 +76,17 @@ class AgoraService:
             privilege_expired_ts
         )
         
+        if key is not None:
+            self._token_cache[key] = (token, privilege_expired_ts)
+            self._token_cache.move_to_end(key)
+            if len(self._token_cache) > TOKEN_CACHE_SIZE:
+                self._token_cache.popitem(last=False)
+        
+        return self._token_response(token, channel_name, uid, privilege_expired_ts)
+    
+    @staticmethod
+    def _token_response(token: str, channel_name: str, uid: int, privilege_expired_ts: int) -> AgoraTokenResponse:
+        """Build the response for a token expiring at privilege_expired_ts."""
         # Convert timestamp to datetime
         expires_at = datetime.fromtimestamp(privilege_expired_ts)
         
@@ -69,12 +107,7 @@ class AgoraService:
         Returns:
             True if valid, False otherwise
         """
-        # Agora channel name requirements:
-        # - ASCII letters, numbers, underscore, hyphen
-        # - 1-64 characters
-        import re
-        pattern = r'^[a-zA-Z0-9_-]{1,64}$'
-        return bool(re.match(pattern, channel_name))
+        return _CHANNEL_RE.match(channel_name) is not None
 
 # Global service instance
 agora_service = AgoraService(
@@ -1,20 +1,42 @@
-from typing import Dict, List, Optional
-import uuid
-from datetime import datetime
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timezone
 
 from app.models import (
-    ChatMessage, ChatResponse, ConversationHistory, 
-    AgentConfig, AIProvider, MessageRole
+    ChatMessage, ChatRequest, ChatResponse, ConversationHistory, 
+    AgentConfig, AIProvider, BatchJob, MessageRole, StoredMessage
 )
 from app.agents import AgentFactory
 from app.agents.base import AIAgent
+from app.agents.batch import BatchProcessor
 from app.core.config import settings
+from app.core.ids import uuid7
+from app.services.conversation_store import conversation_store
+
+# Messages kept per conversation. Past this, the oldest are dropped in one block
+# down to MAX_HISTORY // 2, so the history prefix (and the provider's prompt cache
+# over it) stays stable between trims instead of shifting every turn.
+MAX_HISTORY = 50
+
+# Per-provider defaults, read from settings once
+_DEFAULT_MODELS: Dict[AIProvider, str] = {
+    AIProvider.OPENAI: settings.default_openai_model,
+    AIProvider.ANTHROPIC: settings.default_anthropic_model,
+}
+_API_KEYS: Dict[AIProvider, Optional[str]] = {
+    AIProvider.OPENAI: settings.openai_api_key,
+    AIProvider.ANTHROPIC: settings.anthropic_api_key,
+}
 
 class ChatService:
     """Service for managing chat conversations and AI agents."""
     
     def __init__(self):
-        self.conversations: Dict[str, ConversationHistory] = {}
+        self.conversations = conversation_store
+        # Conversation messages already converted to provider format, keyed by conversation ID,
+        # least recently used first; bounded like the conversation store. Each entry is tied
+        # to the conversation object it mirrors, so a copy reloaded from Redis is reformatted
+        self.formatted_history: "OrderedDict[str, Tuple[ConversationHistory, List[Dict[str, str]]]]" = OrderedDict()
         self.current_agent: Optional[AIAgent] = None
         self.current_provider: AIProvider = settings.default_ai_provider
         self._initialize_default_agent()
@@ -42,21 +64,82 @@ class ChatService:
     
     def _get_default_model(self, provider: AIProvider) -> str:
         """Get the default model for a provider."""
-        if provider == AIProvider.OPENAI:
-            return settings.default_openai_model
-        elif provider == AIProvider.ANTHROPIC:
-            return settings.default_anthropic_model
-        else:
-            return "gpt-4"  # fallback
+        return _DEFAULT_MODELS.get(provider, "gpt-4")  # gpt-4 as fallback
     
     def _get_api_key(self, provider: AIProvider) -> Optional[str]:
         """Get API key for a provider."""
-        if provider == AIProvider.OPENAI:
-            return settings.openai_api_key
-        elif provider == AIProvider.ANTHROPIC:
-            return settings.anthropic_api_key
+        return _API_KEYS.get(provider)
+    
+    def _get_formatted_history(self, conversation: ConversationHistory) -> List[Dict[str, str]]:
+        """
+        Get the conversation in provider message format.
+        
+        Only messages added since the previous call are formatted, so each turn
+        costs O(new messages) instead of reformatting the whole history. The
+        caller gets a snapshot rather than the cached list, which concurrent
+        turns on the same conversation append to and trim while the agent awaits.
+        """
+        entry = self.formatted_history.get(conversation.conversation_id)
+        if entry is None or entry[0] is not conversation:
+            formatted = []
+            self.formatted_history[conversation.conversation_id] = (conversation, formatted)
+            self.formatted_history.move_to_end(conversation.conversation_id)
+            if len(self.formatted_history) > self.conversations.max_entries:
+                # An evicted entry is simply rebuilt from the conversation if needed again
+                self.formatted_history.popitem(last=False)
         else:
-            return None
+            formatted = entry[1]
+            self.formatted_history.move_to_end(conversation.conversation_id)
+        for msg in conversation.messages[len(formatted):]:
+            formatted.append({"role": msg.role.value, "content": msg.content})
+        return list(formatted)
+    
+    def _trim_history(self, conversation: ConversationHistory) -> None:
+        """Once past MAX_HISTORY, drop the oldest messages down to MAX_HISTORY // 2, keeping a user message first."""
+        messages = conversation.messages
+        if len(messages) <= MAX_HISTORY:
+            return
+        excess = len(messages) - MAX_HISTORY // 2
+        # Providers expect the history to open with a user turn
+        while excess < len(messages) and messages[excess].role != MessageRole.USER:
+            excess += 1
+        del messages[:excess]
+        # Keep the formatted cache aligned with the messages it mirrors
+        entry = self.formatted_history.get(conversation.conversation_id)
+        if entry is not None and entry[0] is conversation:
+            del entry[1][:excess]
+    
+    def _record_turn(
+        self, 
+        conversation: ConversationHistory, 
+        user_message: StoredMessage, 
+        reply: StoredMessage, 
+        now: datetime
+    ) -> None:
+        """Append a completed turn to the conversation and trim its history."""
+        conversation.messages.append(user_message)
+        conversation.messages.append(reply)
+        conversation.updated_at = now
+        self._trim_history(conversation)
+    
+    async def _get_or_create_conversation(
+        self, 
+        conversation_id: Optional[str], 
+        user_id: Optional[str], 
+        now: datetime
+    ) -> ConversationHistory:
+        """Get the conversation by ID, or start a new one if there is none."""
+        conversation = await self.conversations.get(conversation_id) if conversation_id else None
+        if conversation is None:
+            conversation = ConversationHistory.model_construct(
+                conversation_id=uuid7().hex,
+                user_id=user_id,
+                messages=[],
+                created_at=now,
+                updated_at=now
+            )
+            self.conversations.put(conversation)
+        return conversation
     
     async def send_message(
         self, 
@@ -75,91 +158,174 @@ class ChatService:
         Returns:
             ChatResponse with AI's reply
         """
-        # Create or get conversation
-        if conversation_id is None or conversation_id not in self.conversations:
-            conversation_id = str(uuid.uuid4())
-            self.conversations[conversation_id] = ConversationHistory(
-                conversation_id=conversation_id,
-                user_id=user_id,
-                messages=[],
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
+        # One timestamp for everything recorded in this turn; IDs are generated
+        # only where a new object is created (the fallback ID only on error)
+        now = datetime.now(timezone.utc)
         
-        conversation = self.conversations[conversation_id]
+        # Models below are assembled from trusted server-side values, so they are
+        # built with model_construct and skip pydantic validation; history entries
+        # are StoredMessage dataclasses
+        
+        # Create or get conversation
+        conversation = await self._get_or_create_conversation(conversation_id, user_id, now)
+        conversation_id = conversation.conversation_id
         
         # Create user message
-        user_message = ChatMessage(
-            id=str(uuid.uuid4()),
+        user_message = StoredMessage(
+            id=uuid7().hex,
             role=MessageRole.USER,
             content=message,
-            timestamp=datetime.utcnow()
+            timestamp=now
         )
         
-        # Add user message to conversation
-        conversation.messages.append(user_message)
-        conversation.updated_at = datetime.utcnow()
-        
         # Generate AI response
         if self.current_agent:
             try:
                 response = await self.current_agent.generate_response(
-                    conversation.messages[:-1],  # Previous messages
+                    self._get_formatted_history(conversation),  # Previous messages
                     message  # Current message
                 )
                 response.conversation_id = conversation_id
                 
-                # Add AI message to conversation
-                conversation.messages.append(response.message)
-                conversation.updated_at = datetime.utcnow()
+                # The turn is recorded only once it succeeds, so a failed call
+                # leaves nothing to undo and a retry doesn't send the message twice
+                ai_message = StoredMessage.from_message(response.message)
+                self._record_turn(conversation, user_message, ai_message, now)
+                await self.conversations.save(conversation, [user_message, ai_message])
                 
                 return response
                 
             except Exception as e:
                 # Fallback response
-                fallback_message = ChatMessage(
-                    id=str(uuid.uuid4()),
+                fallback_message = ChatMessage.model_construct(
+                    id=uuid7().hex,
                     role=MessageRole.ASSISTANT,
                     content=f"I'm sorry, I encountered an error: {str(e)}. Please try again or contact support.",
-                    timestamp=datetime.utcnow(),
+                    timestamp=now,
                     metadata={"error": str(e), "fallback": True}
                 )
                 
-                conversation.messages.append(fallback_message)
-                conversation.updated_at = datetime.utcnow()
-                
-                return ChatResponse(
+                return ChatResponse.model_construct(
                     message=fallback_message,
                     conversation_id=conversation_id,
-                    should_request_screen_share=False
+                    should_request_screen_share=False,
+                    confidence_score=None
                 )
         else:
             # No agent configured
-            no_agent_message = ChatMessage(
-                id=str(uuid.uuid4()),
+            no_agent_message = StoredMessage(
+                id=uuid7().hex,
                 role=MessageRole.ASSISTANT,
                 content="I'm sorry, the AI service is not configured properly. Please check the server configuration.",
-                timestamp=datetime.utcnow(),
+                timestamp=now,
                 metadata={"error": "No AI agent configured"}
             )
             
-            conversation.messages.append(no_agent_message)
-            conversation.updated_at = datetime.utcnow()
+            self._record_turn(conversation, user_message, no_agent_message, now)
+            await self.conversations.save(conversation, [user_message, no_agent_message])
             
-            return ChatResponse(
-                message=no_agent_message,
+            return ChatResponse.model_construct(
+                message=no_agent_message.to_message(),
                 conversation_id=conversation_id,
-                should_request_screen_share=False
+                should_request_screen_share=False,
+                confidence_score=None
             )
     
-    def get_conversation(self, conversation_id: str) -> Optional[ConversationHistory]:
+    async def stream_message(
+        self, 
+        message: str, 
+        conversation_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Union[str, ChatResponse]]:
+        """
+        Send a message and stream the AI response.
+        
+        Args:
+            message: User's message
+            conversation_id: Optional conversation ID
+            user_id: Optional user ID
+            
+        Yields:
+            Text chunks of the reply as the agent produces them, then the
+            complete ChatResponse. The reply is added to the conversation once,
+            when the stream completes.
+        """
+        if not self.current_agent:
+            response = await self.send_message(message, conversation_id, user_id)
+            yield response.message.content
+            yield response
+            return
+        
+        now = datetime.now(timezone.utc)
+        conversation = await self._get_or_create_conversation(conversation_id, user_id, now)
+        user_message = StoredMessage(
+            id=uuid7().hex,
+            role=MessageRole.USER,
+            content=message,
+            timestamp=now
+        )
+        
+        # Nothing is recorded until the stream completes, so a failed or abandoned
+        # stream leaves the conversation as it was
+        response: Optional[ChatResponse] = None
+        async for item in self.current_agent.generate_response_stream(
+            self._get_formatted_history(conversation),
+            message
+        ):
+            if isinstance(item, ChatResponse):
+                response = item
+            else:
+                yield item
+        
+        response.conversation_id = conversation.conversation_id
+        ai_message = StoredMessage.from_message(response.message)
+        self._record_turn(conversation, user_message, ai_message, now)
+        await self.conversations.save(conversation, [user_message, ai_message])
+        
+        yield response
+    
+    def _batch_processor(self) -> BatchProcessor:
+        if not self.current_agent:
+            raise ValueError("No AI agent configured")
+        return BatchProcessor(
+            self.current_agent,
+            max_concurrency=settings.ai_batch_max_concurrency,
+            use_batch_api=settings.ai_use_batch_api
+        )
+    
+    async def process_batch(self, requests: List[ChatRequest]) -> BatchJob:
+        """
+        Answer a batch of independent messages without touching conversation history.
+        
+        Args:
+            requests: Chat requests to answer
+            
+        Returns:
+            BatchJob with the responses, or an in-progress job to poll with
+            get_batch when it was submitted to the provider's batch API
+            
+        Raises:
+            ValueError: If no AI agent is configured
+        """
+        return await self._batch_processor().submit(requests)
+    
+    async def get_batch(self, batch_id: str) -> BatchJob:
+        """
+        Get the status of a provider batch, with its responses once it has ended.
+        
+        Raises:
+            ValueError: If no AI agent is configured or its provider has no batch API
+        """
+        return await self._batch_processor().fetch(batch_id)
+    
+    async def get_conversation(self, conversation_id: str) -> Optional[ConversationHistory]:
         """Get conversation by ID."""
-        return self.conversations.get(conversation_id)
+        return await self.conversations.get(conversation_id)
     
-    def get_conversation_messages(self, conversation_id: str) -> List[ChatMessage]:
+    async def get_conversation_messages(self, conversation_id: str) -> List[ChatMessage]:
         """Get messages from a conversation."""
-        conversation = self.conversations.get(conversation_id)
-        return conversation.messages if conversation else []
+        conversation = await self.conversations.get(conversation_id)
+        return [m.to_message() for m in conversation.messages] if conversation else []
     
     async def switch_agent(self, provider: AIProvider) -> bool:
         """
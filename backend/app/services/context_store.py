@@ -1,6 +1,16 @@
 import os
-import math
-from typing import List, Optional
+import json
+import logging
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import httpx
+import numpy as np
 
 try:
     from supabase import create_client
@@ -24,14 +34,144 @@ except Exception:
 
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
+    from psycopg2.extensions import connection as _PgConnection
+    from psycopg2.pool import ThreadedConnectionPool
 except Exception:
     psycopg2 = None
     RealDictCursor = None
+    execute_values = None
+    _PgConnection = object
+    ThreadedConnectionPool = None
+
+try:
+    import hnswlib
+except Exception:
+    hnswlib = None  # hnswlib optional; the Supabase fallback then scores every row on each query
+
+try:
+    from pgvector.psycopg2 import register_vector
+except Exception:
+    register_vector = None  # pgvector optional; embeddings are then sent as vector text literals
+
+logger = logging.getLogger(__name__)
 
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-3-small')
+# Texts per embedding request when ingesting in bulk (provider request size limits)
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '128'))
+PG_POOL_MAX_CONN = int(os.environ.get('PG_POOL_MAX_CONN', '16'))
+RETRIEVAL_CACHE_SIZE = int(os.environ.get('RETRIEVAL_CACHE_SIZE', '1024'))
+# Seconds a cached retrieval is served; bounds staleness after another worker ingests
+RETRIEVAL_CACHE_TTL = int(os.environ.get('RETRIEVAL_CACHE_TTL', '600'))
+
+# (query, top_k) -> (monotonic time cached, retrieved contents), most recently used
+# last. Shared by the worker threads that run retrieval, hence the lock.
+_retrieval_cache: "OrderedDict[Tuple[str, int], Tuple[float, Tuple[str, ...]]]" = OrderedDict()
+_retrieval_cache_lock = threading.Lock()
+
+# Nearest-neighbour search by cosine distance, served by the HNSW index in
+# scripts/create_embeddings_hnsw_index.sql. Prepared once per connection.
+MATCH_EMBEDDINGS_SQL = (
+    "PREPARE match_embeddings_knn (vector, integer) AS "
+    "SELECT content FROM embeddings ORDER BY embedding <=> $1 LIMIT $2"
+)
+
+# Also store int8-quantized embeddings (scripts/add_embeddings_int8.sql) and have the
+# Supabase client-side fallback fetch those instead of full float vectors
+EMBEDDING_INT8 = os.environ.get('EMBEDDING_INT8', '').lower() in ('1', 'true', 'yes')
+
+# Rebuild the in-process ANN index from Supabase after this many seconds, to pick up
+# rows ingested by other processes
+ANN_REFRESH_SECONDS = int(os.environ.get('ANN_REFRESH_SECONDS', '600'))
+# Rows per request when paging the embeddings table into the ANN index
+SUPABASE_PAGE_SIZE = 1000
+
+OPENAI_EMBEDDINGS_URL = 'https://api.openai.com/v1/embeddings'
+# Keep-alive pool for async embedding requests
+EMBEDDING_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_http_client: Optional[httpx.AsyncClient] = None
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', '10000'))
+
+# blake2b(text) -> embedding, most recently used last
+_embedding_cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+
+class _VectorConnection(_PgConnection):
+    """Postgres connection with pgvector types registered and the knn search prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if register_vector:
+            register_vector(self)
+        with self.cursor() as cur:
+            cur.execute(MATCH_EMBEDDINGS_SQL)
+        self.commit()
+
+
+# Connections are pooled across requests so the TCP/TLS/auth handshake and the
+# prepared statement are paid once per connection, not once per query
+_pg_pool: Optional["ThreadedConnectionPool"] = None
+_pg_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises instead of waiting when exhausted; callers queue here
+_pg_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX_CONN)
+
+
+def _get_pg_pool(dsn: str) -> "ThreadedConnectionPool":
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                _pg_pool = ThreadedConnectionPool(
+                    1, PG_POOL_MAX_CONN, dsn, connection_factory=_VectorConnection
+                )
+    return _pg_pool
+
+
+@contextmanager
+def _get_conn(dsn: str, autocommit: bool = False):
+    """Borrow a pooled Postgres connection.
+
+    Without autocommit the work is committed on success and rolled back on error.
+    Broken connections are discarded instead of being returned to the pool.
+    """
+    pool = _get_pg_pool(dsn)
+    with _pg_pool_slots:
+        conn = pool.getconn()
+        try:
+            conn.autocommit = autocommit
+            yield conn
+            if not autocommit:
+                conn.commit()
+        except Exception:
+            if not autocommit and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+
+def _pg_vector(emb: List[float]):
+    """Bind an embedding as a vector parameter: a numpy array via pgvector's adapter, else a text literal."""
+    if register_vector:
+        return np.asarray(emb, dtype=np.float32)
+    return '[' + ','.join(str(float(x)) for x in emb) + ']'
+
+
+def _normalize(emb: List[float]) -> np.ndarray:
+    """Scale emb to unit length as float32, so cosine similarity against it is a plain dot product."""
+    vec = np.asarray(emb, dtype=np.float32)
+    return vec / (np.linalg.norm(vec) or 1.0)
+
+
+def _quantize_int8(emb: List[float]) -> Tuple[bytes, float]:
+    """Symmetric per-vector int8 quantization: returns (int8 bytes, scale) with emb ~= q * scale."""
+    vec = np.asarray(emb, dtype=np.float32)
+    scale = float(np.abs(vec).max()) / 127 or 1.0
+    return np.round(vec / scale).astype(np.int8).tobytes(), scale
 
 
 def _get_supabase_client():
@@ -44,69 +184,187 @@ def get_embedding(text: str) -> Optional[List[float]]:
     """Get embedding vector for a given text using Voyage AI (preferred) or OpenAI as fallback.
 
     Uses VOYAGE_API_KEY if present to call Voyage embeddings. Falls back to OpenAI if configured.
-    Returns None if no provider is configured.
+    Returns None if no provider is configured. Embeddings are kept in an in-process LRU keyed
+    by a hash of the text, so repeated texts skip the provider round trip.
+    """
+    return get_embeddings([text])[0]
+
+
+async def get_embedding_async(text: str) -> Optional[List[float]]:
+    """Async get_embedding, for callers on the event loop."""
+    return (await get_embeddings_async([text]))[0]
+
+
+def get_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """Get embedding vectors for several texts, with one provider call for all cache misses.
+
+    Returns one entry per text, None where no embedding could be computed.
     """
+    keys, results, missing = _lookup_embeddings(texts)
+    if missing:
+        _store_embeddings(keys, results, missing, _fetch_embeddings([texts[i] for i in missing]))
+    return results
+
+
+async def get_embeddings_async(texts: List[str]) -> List[Optional[List[float]]]:
+    """Async get_embeddings: the OpenAI request doesn't block the event loop."""
+    keys, results, missing = _lookup_embeddings(texts)
+    if missing:
+        _store_embeddings(keys, results, missing, await _fetch_embeddings_async([texts[i] for i in missing]))
+    return results
+
+
+def _lookup_embeddings(texts: List[str]) -> Tuple[List[str], List[Optional[List[float]]], List[int]]:
+    """Return cache keys, cached vectors (None on a miss) and the indexes that missed."""
+    keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest() for text in texts]
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    missing = []
+    with _embedding_cache_lock:
+        for i, key in enumerate(keys):
+            cached = _embedding_cache.get(key)
+            if cached is not None:
+                _embedding_cache.move_to_end(key)
+                results[i] = list(cached)
+            else:
+                missing.append(i)
+    return keys, results, missing
+
+
+def _store_embeddings(
+    keys: List[str],
+    results: List[Optional[List[float]]],
+    missing: List[int],
+    fetched: Optional[List[List[float]]]
+) -> None:
+    if not fetched:
+        return
+    with _embedding_cache_lock:
+        for i, emb in zip(missing, fetched):
+            results[i] = emb
+            _embedding_cache[keys[i]] = tuple(emb)
+            if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for embedding requests (HTTP/2 when h2 is installed)."""
+    global _http_client
+    if _http_client is None:
+        try:
+            _http_client = httpx.AsyncClient(timeout=30, http2=True, limits=EMBEDDING_HTTP_LIMITS)
+        except ImportError:
+            _http_client = httpx.AsyncClient(timeout=30, limits=EMBEDDING_HTTP_LIMITS)
+    return _http_client
+
+
+def _fetch_embeddings(texts: List[str]) -> Optional[List[List[float]]]:
+    """Embed texts with a single provider request; returns one vector per text or None."""
+    embs = _fetch_voyage_embeddings(texts)
+    if embs:
+        return embs
+
+    # Fallback: try OpenAI (if available)
+    OPENAI_KEY = os.environ.get('OPENAI_API_KEY')
+    logger.debug('[get_embedding] OPENAI_KEY present: %s, requests module: %s', bool(OPENAI_KEY), requests is not None)
+    if requests and OPENAI_KEY:
+        try:
+            logger.debug('[get_embedding] Using OpenAI with model=%s', EMBEDDING_MODEL)
+            r = requests.post(
+                OPENAI_EMBEDDINGS_URL,
+                headers=_openai_headers(OPENAI_KEY),
+                json={'model': EMBEDDING_MODEL, 'input': texts},
+                timeout=30
+            )
+            r.raise_for_status()
+            embs = _parse_openai_embeddings(r.json(), len(texts))
+            if embs:
+                return embs
+        except Exception as e:
+            logger.exception('[get_embedding] OpenAI embedding failed: %s', e)
+
+    logger.warning('[get_embedding] No embedding provider available')
+    return None
+
+
+async def _fetch_embeddings_async(texts: List[str]) -> Optional[List[List[float]]]:
+    """Async _fetch_embeddings over the shared HTTP client."""
+    # The Voyage SDK client is synchronous; keep it off the event loop
+    embs = await asyncio.to_thread(_fetch_voyage_embeddings, texts)
+    if embs:
+        return embs
+
+    OPENAI_KEY = os.environ.get('OPENAI_API_KEY')
+    logger.debug('[get_embedding] OPENAI_KEY present: %s', bool(OPENAI_KEY))
+    if OPENAI_KEY:
+        try:
+            logger.debug('[get_embedding] Using OpenAI with model=%s', EMBEDDING_MODEL)
+            r = await _get_http_client().post(
+                OPENAI_EMBEDDINGS_URL,
+                headers=_openai_headers(OPENAI_KEY),
+                json={'model': EMBEDDING_MODEL, 'input': texts}
+            )
+            r.raise_for_status()
+            embs = _parse_openai_embeddings(r.json(), len(texts))
+            if embs:
+                return embs
+        except Exception as e:
+            logger.exception('[get_embedding] OpenAI embedding failed: %s', e)
+
+    logger.warning('[get_embedding] No embedding provider available')
+    return None
+
+
+def _fetch_voyage_embeddings(texts: List[str]) -> Optional[List[List[float]]]:
     # Prefer Voyage AI if configured (local env VOYAGE_API_KEY)
     VOYAGE_KEY = os.environ.get('VOYAGE_API_KEY')
-    print(f'[get_embedding] VOYAGE_KEY present: {bool(VOYAGE_KEY)}, voyage module: {voyage is not None}')
+    logger.debug('[get_embedding] VOYAGE_KEY present: %s, voyage module: %s', bool(VOYAGE_KEY), voyage is not None)
     if voyage and VOYAGE_KEY:
         try:
             model = os.environ.get('VOYAGE_EMBEDDING_MODEL', 'voyage-3-large')
-            print(f'[get_embedding] Using Voyage with model={model}')
+            logger.debug('[get_embedding] Using Voyage with model=%s', model)
             # voyage.Client will pick up env var if not passed; pass explicitly for clarity
             # voyage and voyageai expose Client
             client = getattr(voyage, 'Client')(api_key=VOYAGE_KEY)
-            # newer voyageai client uses embed or embeddings API; try common call
+            # newer voyageai client uses embed or embeddings API; try common call.
+            # Both accept a list of inputs and return one vector per input.
             if hasattr(client, 'embed'):
-                resp = client.embed(text, model=model)
+                resp = client.embed(texts, model=model)
             elif hasattr(client, 'embeddings'):
-                resp = client.embeddings.create(input=text, model=model)
+                resp = client.embeddings.create(input=texts, model=model)
             else:
                 resp = None
-            print(f'[get_embedding] Voyage response: {resp is not None}')
-            emb = None
+            logger.debug('[get_embedding] Voyage response: %s', resp is not None)
+            embs = None
             # voyage examples return an object with .embeddings
             if hasattr(resp, 'embeddings'):
-                emb = resp.embeddings
+                embs = resp.embeddings
             elif isinstance(resp, dict):
-                emb = resp.get('embeddings')
-            # Some clients return [[vec]] (batch) — flatten to a single vector
-            if isinstance(emb, list) and len(emb) > 0 and isinstance(emb[0], (list, tuple)):
-                emb = emb[0]
-            if emb:
-                print(f'[get_embedding] Voyage embedding successful, vector length: {len(emb)}')
-                return emb
+                embs = resp.get('embeddings')
+            if embs and len(embs) == len(texts):
+                logger.debug('[get_embedding] Voyage embedding successful, vector length: %d', len(embs[0]))
+                return [list(emb) for emb in embs]
         except Exception as e:
-            print(f'[get_embedding] Voyage embedding failed: {type(e).__name__}: {e}')
-            print('Voyage embedding call failed:', e)
+            logger.exception('[get_embedding] Voyage embedding failed: %s', e)
 
     # Anthropic/Claude does not currently provide public embeddings for many models;
     # prefer Voyage when available, otherwise fall back to OpenAI embeddings.
+    return None
+
+
+def _openai_headers(api_key: str) -> dict:
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
 
-    # Fallback: try OpenAI (if available)
-    OPENAI_KEY = os.environ.get('OPENAI_API_KEY')
-    print(f'[get_embedding] OPENAI_KEY present: {bool(OPENAI_KEY)}, requests module: {requests is not None}')
-    if requests and OPENAI_KEY:
-        try:
-            print(f'[get_embedding] Using OpenAI with model={EMBEDDING_MODEL}')
-            url = 'https://api.openai.com/v1/embeddings'
-            headers = {
-                'Authorization': f'Bearer {OPENAI_KEY}',
-                'Content-Type': 'application/json'
-            }
-            payload = {'model': EMBEDDING_MODEL, 'input': text}
-            r = requests.post(url, headers=headers, json=payload, timeout=30)
-            r.raise_for_status()
-            j = r.json()
-            emb = j.get('data', [])[0].get('embedding') if j.get('data') else None
-            if emb:
-                print(f'[get_embedding] OpenAI embedding successful, vector length: {len(emb)}')
-                return emb
-        except Exception as e:
-            print(f'[get_embedding] OpenAI embedding failed: {type(e).__name__}: {e}')
-            print('OpenAI embedding call failed:', e)
 
-    print('[get_embedding] No embedding provider available')
+def _parse_openai_embeddings(body: dict, count: int) -> Optional[List[List[float]]]:
+    data = body.get('data') or []
+    # results carry the index of their input; don't rely on response order
+    embs = [d.get('embedding') for d in sorted(data, key=lambda d: d.get('index', 0))]
+    if len(embs) == count and all(embs):
+        logger.debug('[get_embedding] OpenAI embedding successful, vector length: %d', len(embs[0]))
+        return embs
     return None
 
 
@@ -115,37 +373,63 @@ def ingest_text(content: str) -> bool:
 
     Returns True if insert succeeded, False otherwise. Skips if Supabase not configured.
     """
+    return ingest_texts([content]) == 1
+
+
+def ingest_texts(contents: List[str]) -> int:
+    """Ingest several text chunks, embedding them in batches and inserting them in one statement.
+
+    Returns the number of chunks stored (0 if nothing could be ingested). Cached retrieval
+    results are dropped after a successful insert, since the new content may now rank for them.
+    """
+    count = _ingest_texts(contents)
+    if count:
+        with _retrieval_cache_lock:
+            _retrieval_cache.clear()
+    return count
+
+
+def _ingest_texts(contents: List[str]) -> int:
     # Try Postgres ingestion first if DSN provided
     POSTGRES_DSN = os.environ.get('POSTGRES_DSN')
-    print(f'[ingest_text] POSTGRES_DSN present: {bool(POSTGRES_DSN)}')
-    emb = get_embedding(content)
-    print(f'[ingest_text] embedding result: {emb is not None}, emb_len: {len(emb) if emb else 0}')
-    if emb is None:
-        print('Embedding not available; skipping ingest')
-        return False
+    logger.debug('[ingest_text] POSTGRES_DSN present: %s', bool(POSTGRES_DSN))
+    embs: List[Optional[List[float]]] = []
+    for start in range(0, len(contents), EMBEDDING_BATCH_SIZE):
+        embs.extend(get_embeddings(contents[start:start + EMBEDDING_BATCH_SIZE]))
+    # Stored vectors are unit length (see scripts/normalize_embeddings.sql for older rows)
+    rows = [(content, _normalize(emb).tolist()) for content, emb in zip(contents, embs) if emb]
+    logger.debug('[ingest_text] embedded %d of %d chunks', len(rows), len(contents))
+    if not rows:
+        logger.warning('[ingest_text] Embedding not available; skipping ingest')
+        return 0
 
     if POSTGRES_DSN and psycopg2:
         try:
-            conn = psycopg2.connect(POSTGRES_DSN)
-            cur = conn.cursor()
-            # convert embedding list to Postgres array literal
-            emb_pg = '{' + ','.join(str(float(x)) for x in emb) + '}'
-            cur.execute("INSERT INTO embeddings (content, embedding) VALUES (%s, %s::vector)", (content, emb_pg))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return True
+            with _get_conn(POSTGRES_DSN) as conn, conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    "INSERT INTO embeddings (content, embedding) VALUES %s",
+                    [(content, _pg_vector(emb)) for content, emb in rows],
+                    template="(%s, %s::vector)"
+                )
+            return len(rows)
         except Exception as e:
-            print('Postgres ingest failed:', e)
+            logger.exception('[ingest_text] Postgres ingest failed: %s', e)
 
     # Fallback to Supabase ingestion
     supabase = _get_supabase_client()
     if not supabase:
-        print('Supabase not configured; skipping ingest')
-        return False
+        logger.warning('[ingest_text] Supabase not configured; skipping ingest')
+        return 0
 
     try:
-        payload = {'content': content, 'embedding': emb}
+        payload = [{'content': content, 'embedding': emb} for content, emb in rows]
+        if EMBEDDING_INT8:
+            for row, (_, emb) in zip(payload, rows):
+                quantized, scale = _quantize_int8(emb)
+                # PostgREST takes bytea as '\x'-prefixed hex
+                row['embedding_i8'] = '\\x' + quantized.hex()
+                row['embedding_scale'] = scale
         res = supabase.table('embeddings').insert(payload).execute()
         # supabase client may return an object with .data or a dict-like result
         data = None
@@ -159,23 +443,211 @@ def ingest_text(content: str) -> bool:
             except Exception:
                 data = None
         if data:
-            return True
+            # Keep the ANN index in step without waiting for its next rebuild
+            ann = _ann
+            if ann is not None:
+                ann_contents, matrix = _parse_embedding_rows(
+                    [{'content': content, 'embedding': emb} for content, emb in rows], ann.dim
+                )
+                ann.add(matrix, ann_contents)
+            return len(data)
     except Exception as e:
-        print('Failed to ingest to supabase:', e)
+        logger.exception('[ingest_text] Failed to ingest to supabase: %s', e)
+
+    return 0
+
+
+class _AnnIndex:
+    """In-process HNSW index over the Supabase embeddings table.
+
+    Lets the Supabase fallback answer a query with an approximate nearest-neighbour
+    lookup instead of downloading and scoring every row. Labels are positions in
+    contents; all index access goes through the lock.
+    """
+
+    def __init__(self, dim: int, vectors: np.ndarray, contents: List[str]):
+        self.dim = dim
+        self.contents: List[str] = []
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.index = hnswlib.Index(space='cosine', dim=dim)
+        self.index.init_index(max_elements=max(2 * len(contents), 1024), M=16, ef_construction=200)
+        self.index.set_ef(64)
+        self.add(vectors, contents)
+
+    def add(self, vectors: np.ndarray, contents: List[str]) -> None:
+        if not contents:
+            return
+        with self.lock:
+            start = len(self.contents)
+            end = start + len(contents)
+            if end > self.index.get_max_elements():
+                self.index.resize_index(2 * end)
+            self.index.add_items(vectors, np.arange(start, end))
+            self.contents.extend(contents)
 
-    return False
+    def query(self, query_vec: np.ndarray, top_k: int) -> List[str]:
+        with self.lock:
+            k = min(top_k, len(self.contents))
+            if k <= 0:
+                return []
+            # ef bounds the candidate list and must be at least k
+            self.index.set_ef(max(64, k))
+            labels, _ = self.index.knn_query(query_vec, k=k)
+        return [self.contents[i] for i in labels[0]]
 
 
-def _cosine_sim(a: List[float], b: List[float]) -> float:
-    # Compute cosine similarity between vectors a and b
-    if not a or not b or len(a) != len(b):
-        return -1.0
-    dot = sum(x * y for x, y in zip(a, b))
-    norma = math.sqrt(sum(x * x for x in a))
-    normb = math.sqrt(sum(y * y for y in b))
-    if norma == 0 or normb == 0:
-        return -1.0
-    return dot / (norma * normb)
+_ann: Optional[_AnnIndex] = None
+_ann_lock = threading.Lock()
+
+
+def _get_ann_index(supabase, dim: int) -> Optional[_AnnIndex]:
+    """Return the ANN index for dim-sized embeddings, (re)building it from Supabase when stale.
+
+    Only one thread rebuilds at a time. Until a first index exists callers wait for it;
+    after that a stale index keeps serving queries while it is rebuilt.
+    """
+    global _ann
+    if not hnswlib:
+        return None
+    ann = _ann
+    usable = ann is not None and ann.dim == dim
+    if usable and time.monotonic() - ann.built_at < ANN_REFRESH_SECONDS:
+        return ann
+    if not _ann_lock.acquire(blocking=not usable):
+        return ann
+
+    try:
+        ann = _ann
+        usable = ann is not None and ann.dim == dim
+        if usable and time.monotonic() - ann.built_at < ANN_REFRESH_SECONDS:
+            return ann
+        loaded = _load_ann_vectors(supabase, dim)
+        if loaded is None:
+            return ann if usable else None
+        _ann = _AnnIndex(dim, loaded[1], loaded[0])
+        return _ann
+    finally:
+        _ann_lock.release()
+
+
+def _load_ann_vectors(supabase, dim: int) -> Optional[Tuple[List[str], np.ndarray]]:
+    """Page through the embeddings table once, returning (contents, matrix) or None on failure.
+
+    With EMBEDDING_INT8 the int8 column is fetched instead of the float one; cosine
+    distance ignores the per-vector scale, so the raw int8 values are indexed.
+    """
+    columns = 'content,embedding_i8' if EMBEDDING_INT8 else 'content,embedding'
+    # PostgREST caps the rows returned per request
+    rows = []
+    try:
+        while True:
+            res = supabase.table('embeddings').select(columns).range(
+                len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1
+            ).execute()
+            page = (res.data if hasattr(res, 'data') else res.get('data')) or []
+            rows.extend(page)
+            if len(page) < SUPABASE_PAGE_SIZE:
+                break
+    except Exception as e:
+        logger.exception('[retrieve] Failed to load embeddings for the ANN index: %s', e)
+        return None
+    if EMBEDDING_INT8:
+        return _parse_int8_rows(rows, dim)
+    return _parse_embedding_rows(rows, dim)
+
+
+def _parse_embedding_rows(rows: List[dict], dim: int) -> Tuple[List[str], np.ndarray]:
+    """Collect the contents and (N, dim) float32 embedding matrix of rows with a usable embedding."""
+    contents = []
+    vectors = []
+    for r in rows:
+        emb = r.get('embedding')
+        content = r.get('content')
+        if not emb or not content:
+            continue
+        if isinstance(emb, str):
+            # pgvector columns come back from PostgREST as '[x,y,...]' text
+            try:
+                emb = json.loads(emb)
+            except ValueError:
+                continue
+        if len(emb) != dim:
+            continue
+        contents.append(content)
+        vectors.append(emb)
+
+    return contents, np.asarray(vectors, dtype=np.float32).reshape(len(vectors), dim)
+
+
+def _rank_by_cosine(query_emb: List[float], rows: List[dict], top_k: int) -> List[str]:
+    """Return the content of the top_k rows whose embeddings are most cosine-similar to query_emb.
+
+    Stored embeddings are unit vectors, so with the query normalized once the cosine
+    is just the dot product and no per-row norms are computed.
+    """
+    query_vec = _normalize(query_emb)
+    contents, matrix = _parse_embedding_rows(rows, len(query_vec))
+    if not contents:
+        return []
+    return _top_k(matrix @ query_vec, contents, top_k)
+
+
+def _rank_by_cosine_int8(query_emb: List[float], rows: List[dict], top_k: int) -> List[str]:
+    """Like _rank_by_cosine, for rows carrying int8-quantized embeddings (embedding_i8).
+
+    The per-vector scale cancels out of the cosine, so rows are ranked on their raw int8
+    values against the full-precision query. Rounding leaves the int8 rows off unit
+    length, so unlike the float path their norms are still divided out.
+    """
+    query_vec = _normalize(query_emb)
+    contents, matrix = _parse_int8_rows(rows, len(query_vec))
+    if not contents:
+        return []
+    norms = np.linalg.norm(matrix, axis=1)
+    return _top_k((matrix @ query_vec) / np.where(norms > 0, norms, 1.0), contents, top_k)
+
+
+def _parse_int8_rows(rows: List[dict], dim: int) -> Tuple[List[str], np.ndarray]:
+    """Collect the contents and (N, dim) matrix of rows with a usable embedding_i8, as float32."""
+    contents = []
+    chunks = []
+    for r in rows:
+        raw = r.get('embedding_i8')
+        content = r.get('content')
+        if not raw or not content:
+            continue
+        if isinstance(raw, str):
+            # bytea comes back from PostgREST as '\x...' hex text
+            try:
+                raw = bytes.fromhex(raw[2:] if raw.startswith('\\x') else raw)
+            except ValueError:
+                continue
+        if len(raw) != dim:
+            continue
+        contents.append(content)
+        chunks.append(raw)
+
+    # One contiguous (N, dim) int8 block: a quarter of the float32 bytes on the wire
+    matrix = np.frombuffer(b''.join(chunks), dtype=np.int8).reshape(len(chunks), dim)
+    return contents, matrix.astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, contents: List[str], top_k: int) -> List[str]:
+    """Return the contents with the top_k highest scores, best first."""
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return []
+    if k == len(scores):
+        # Every row is returned; nothing to partition away
+        top = np.argsort(-scores, kind='stable')
+    else:
+        # O(N) partial selection of the k best, then sort only those k. argpartition
+        # leaves them in arbitrary order, so put them back in row order first for
+        # ties to resolve by row as in the full sort.
+        top = np.sort(np.argpartition(-scores, k - 1)[:k])
+        top = top[np.argsort(-scores[top], kind='stable')]
+    return [contents[i] for i in top]
 
 
 def retrieve_similar_context(query: str, top_k: int = 5) -> List[str]:
@@ -185,28 +657,38 @@ def retrieve_similar_context(query: str, top_k: int = 5) -> List[str]:
     It's intentionally simple and works without Postgres vector operator support.
     Returns a list of content strings (may be empty).
     """
-    # If local Postgres DSN is configured, prefer DB-side search there
-    POSTGRES_DSN = os.environ.get('POSTGRES_DSN')
     query_emb = get_embedding(query)
     if query_emb is None:
         return []
+    return _search_similar(query_emb, top_k)
+
+
+async def retrieve_similar_context_async(query: str, top_k: int = 5) -> List[str]:
+    """Async retrieve_similar_context: embeds on the event loop, searches in a worker thread."""
+    query_emb = await get_embedding_async(query)
+    if query_emb is None:
+        return []
+    # psycopg2 and the supabase client are synchronous
+    return await asyncio.to_thread(_search_similar, query_emb, top_k)
+
+
+def _search_similar(query_emb: List[float], top_k: int) -> List[str]:
+    # Normalize once; every backend below then compares unit vectors
+    query_emb = _normalize(query_emb).tolist()
+
+    # If local Postgres DSN is configured, prefer DB-side search there
+    POSTGRES_DSN = os.environ.get('POSTGRES_DSN')
 
     if POSTGRES_DSN and psycopg2:
         try:
-            conn = psycopg2.connect(POSTGRES_DSN)
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            # pass embedding as Postgres array literal and cast to vector
-            emb_pg = '{' + ','.join(str(float(x)) for x in query_emb) + '}'
-            cur.execute(
-                "SELECT content FROM embeddings ORDER BY embedding <-> (%s::vector) LIMIT %s",
-                (emb_pg, top_k)
-            )
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
+            # Read-only: autocommit skips the BEGIN/COMMIT round trips
+            with _get_conn(POSTGRES_DSN, autocommit=True) as conn, \
+                    conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("EXECUTE match_embeddings_knn (%s, %s)", (_pg_vector(query_emb), top_k))
+                rows = cur.fetchall()
             return [r['content'] for r in rows if r.get('content')]
         except Exception as e:
-            print('Postgres vector search failed:', e)
+            logger.exception('[retrieve] Postgres vector search failed: %s', e)
 
     # Else try Supabase RPC (if configured)
     supabase = _get_supabase_client()
@@ -225,10 +707,15 @@ def retrieve_similar_context(query: str, top_k: int = 5) -> List[str]:
             if data:
                 return [r.get('content') for r in data if r.get('content')]
         except Exception as e:
-            print('Supabase RPC match_embeddings failed or not present; falling back to client-side scoring:', e)
+            logger.warning('[retrieve] Supabase RPC match_embeddings failed or not present; falling back to client-side scoring: %s', e)
+
+        ann = _get_ann_index(supabase, len(query_emb))
+        if ann is not None:
+            return ann.query(np.asarray(query_emb, dtype=np.float32), top_k)
 
+        columns = 'id,content,embedding_i8' if EMBEDDING_INT8 else 'id,content,embedding'
         try:
-            res = supabase.table('embeddings').select('id,content,embedding').execute()
+            res = supabase.table('embeddings').select(columns).execute()
             if hasattr(res, 'data'):
                 rows = res.data or []
             elif isinstance(res, dict):
@@ -237,23 +724,38 @@ def retrieve_similar_context(query: str, top_k: int = 5) -> List[str]:
                 # try attribute access
                 rows = []
         except Exception as e:
-            print('Failed to fetch embeddings from supabase:', e)
+            logger.exception('[retrieve] Failed to fetch embeddings from supabase: %s', e)
             return []
 
-        scored = []
-        for r in rows:
-            emb = r.get('embedding')
-            if not emb:
-                continue
-            try:
-                score = _cosine_sim(query_emb, emb)
-            except Exception:
-                score = -1.0
-            scored.append((score, r.get('content')))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-        results = [c for _, c in scored[:top_k] if c]
-        return results
+        if EMBEDDING_INT8:
+            return _rank_by_cosine_int8(query_emb, rows, top_k)
+        return _rank_by_cosine(query_emb, rows, top_k)
 
     # Nothing configured
     return []
+
+
+async def retrieve_similar_context_cached(query: str, top_k: int = 5) -> List[str]:
+    """Retrieve similar content like retrieve_similar_context_async, reusing results for repeated queries.
+
+    Results are kept in a process-wide LRU keyed by (query, top_k) for up to
+    RETRIEVAL_CACHE_TTL seconds; ingest_texts clears it only in the ingesting process.
+    Empty results are not cached so a transient embedding or database failure is
+    retried on the next call.
+    """
+    key = (query, top_k)
+    with _retrieval_cache_lock:
+        cached = _retrieval_cache.get(key)
+        if cached is not None:
+            if time.monotonic() - cached[0] < RETRIEVAL_CACHE_TTL:
+                _retrieval_cache.move_to_end(key)
+                return list(cached[1])
+            del _retrieval_cache[key]
+
+    results = await retrieve_similar_context_async(query, top_k)
+    if results:
+        with _retrieval_cache_lock:
+            _retrieval_cache[key] = (time.monotonic(), tuple(results))
+            if len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                _retrieval_cache.popitem(last=False)
+    return results
@@ -0,0 +1,156 @@
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.models import ConversationHistory, StoredMessage
+
+logger = logging.getLogger(__name__)
+
+try:
+    from redis.exceptions import WatchError
+except Exception:  # redis optional; save() never reaches Redis without it
+    class WatchError(Exception):
+        pass
+
+_MESSAGE_ADAPTER = TypeAdapter(StoredMessage)
+
+# Attempts at a save whose version check keeps losing to concurrent writers
+SAVE_RETRIES = 5
+
+
+class ConversationStore:
+    """
+    Holds conversation histories.
+
+    Recently used conversations live in a bounded in-process LRU. With
+    use_redis set (and Redis configured) they are also persisted to Redis, so
+    conversations survive restarts and are shared between workers:
+    conv:{id} holds the conversation fields, conv:{id}:msgs is a list of
+    message JSON that each turn appends to, instead of rewriting the history,
+    and conv:{id}:ver counts the saves. A worker serves its in-process copy
+    only while that version still matches, and reloads from Redis otherwise.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: int = 86400, use_redis: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_redis = use_redis
+        # conversation ID -> (conversation, Redis version it reflects)
+        self._entries: "OrderedDict[str, Tuple[ConversationHistory, int]]" = OrderedDict()
+
+    def _redis(self):
+        return get_redis() if self.use_redis else None
+
+    def _remember(self, conversation: ConversationHistory, version: int) -> None:
+        self._entries[conversation.conversation_id] = (conversation, version)
+        self._entries.move_to_end(conversation.conversation_id)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, conversation_id: str) -> Optional[ConversationHistory]:
+        """Get a conversation by ID from memory, reloading it from Redis if another worker changed it."""
+        entry = self._entries.get(conversation_id)
+        if entry is not None:
+            self._entries.move_to_end(conversation_id)
+        redis = self._redis()
+        if redis is None:
+            return entry[0] if entry else None
+
+        key = f"conv:{conversation_id}"
+        if entry is not None:
+            try:
+                version = int(await redis.get(f"{key}:ver") or 0)
+            except Exception as e:
+                logger.warning('[Conversation store] Redis get failed: %s', e)
+                return entry[0]
+            if version == entry[1]:
+                return entry[0]
+
+        try:
+            # One transaction, so the fields, messages and version are a consistent snapshot
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.get(key)
+                pipe.lrange(f"{key}:msgs", 0, -1)
+                pipe.get(f"{key}:ver")
+                raw, raw_messages, version = await pipe.execute()
+        except Exception as e:
+            logger.warning('[Conversation store] Redis get failed: %s', e)
+            return entry[0] if entry else None
+        if raw is None:
+            return entry[0] if entry else None
+
+        conversation = ConversationHistory.model_validate_json(raw)
+        conversation.messages = [_MESSAGE_ADAPTER.validate_json(m) for m in raw_messages]
+        self._remember(conversation, int(version or 0))
+        return conversation
+
+    def put(self, conversation: ConversationHistory) -> None:
+        """Add a new conversation to the in-process cache; it reaches Redis on its first save."""
+        self._remember(conversation, 0)
+
+    async def save(self, conversation: ConversationHistory, new_messages: List[StoredMessage]) -> None:
+        """
+        Persist a turn: the conversation fields plus the messages it appended.
+
+        If this worker's copy was current, the Redis message list is trimmed to
+        the same length as the in-memory history, which may have dropped its
+        oldest messages. If another worker saved in the meantime, the new
+        messages are only appended and the local copy is dropped, so the next
+        get reloads the merged history.
+        """
+        entry = self._entries.get(conversation.conversation_id)
+        known_version = entry[1] if entry is not None and entry[0] is conversation else 0
+        redis = self._redis()
+        if redis is None:
+            self._remember(conversation, known_version)
+            return
+
+        key = f"conv:{conversation.conversation_id}"
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                for _ in range(SAVE_RETRIES):
+                    try:
+                        await pipe.watch(f"{key}:ver")
+                        version = int(await pipe.get(f"{key}:ver") or 0)
+                        in_sync = version == known_version
+                        pipe.multi()
+                        pipe.set(key, conversation.model_dump_json(exclude={"messages"}), ex=self.ttl)
+                        if new_messages:
+                            pipe.rpush(f"{key}:msgs", *(_MESSAGE_ADAPTER.dump_json(m) for m in new_messages))
+                        if in_sync and conversation.messages:
+                            pipe.ltrim(f"{key}:msgs", -len(conversation.messages), -1)
+                        elif in_sync:
+                            pipe.delete(f"{key}:msgs")
+                        pipe.expire(f"{key}:msgs", self.ttl)
+                        pipe.incr(f"{key}:ver")
+                        pipe.expire(f"{key}:ver", self.ttl)
+                        await pipe.execute()
+                        break
+                    except WatchError:
+                        # Another worker saved between the version read and the write; re-check
+                        continue
+                else:
+                    logger.warning('[Conversation store] Redis save gave up after %d conflicts', SAVE_RETRIES)
+                    self._entries.pop(conversation.conversation_id, None)
+                    return
+        except Exception as e:
+            logger.warning('[Conversation store] Redis save failed: %s', e)
+            self._remember(conversation, known_version)
+            return
+
+        if in_sync:
+            self._remember(conversation, version + 1)
+        else:
+            self._entries.pop(conversation.conversation_id, None)
+
+
+# Global conversation store instance
+conversation_store = ConversationStore(
+    max_entries=settings.conversation_cache_max_entries,
+    ttl=settings.conversation_ttl,
+    use_redis=settings.conversation_use_redis
+)
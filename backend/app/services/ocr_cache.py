@@ -0,0 +1,67 @@
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class OCRCache:
+    """
+    Caches OCR text by image content hash.
+
+    A bounded in-process LRU sits in front of an optional Redis layer, so
+    re-uploads of the same screenshot skip OCR across workers and restarts.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: int = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Get the OCR text cached under key, computing and storing it on a miss.
+
+        Args:
+            key: Content hash of the image
+            compute: Coroutine factory that runs OCR
+
+        Returns:
+            The extracted text
+        """
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            return text
+
+        redis = get_redis()
+        redis_key = f"ocr:{key}"
+        if redis is not None:
+            try:
+                text = await redis.get(redis_key)
+            except Exception as e:
+                # Redis is only a cache; fall through to OCR when it is unavailable
+                logger.warning('[OCR cache] Redis get failed: %s', e)
+
+        if text is None:
+            text = await compute()
+            if redis is not None:
+                try:
+                    await redis.set(redis_key, text, ex=self.ttl)
+                except Exception as e:
+                    logger.warning('[OCR cache] Redis set failed: %s', e)
+
+        self._entries[key] = text
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return text
+
+
+# Global OCR cache instance
+ocr_cache = OCRCache(
+    max_entries=settings.ocr_cache_max_entries,
+    ttl=settings.ocr_cache_ttl
+)
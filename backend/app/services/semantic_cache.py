@@ -0,0 +1,111 @@
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class SemanticCache:
+    """
+    In-process cache that maps query embeddings to serialized agent responses.
+
+    Embeddings are stored as unit-normalized rows of a single matrix, so a lookup
+    is one matrix-vector product followed by an argmax over cosine similarities.
+    Each entry carries the scope it was stored under (e.g. the agent's provider,
+    model and system prompt), and only entries of the caller's scope can match.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Tuple[float, Hashable, Dict[str, Any]]] = []  # (expires_at, scope, payload)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.ndim != 1:
+            return None
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def get(
+        self,
+        embedding: List[float],
+        threshold: float = 0.92,
+        scope: Hashable = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the cached payload most similar to the given embedding.
+
+        Args:
+            embedding: Query embedding
+            threshold: Minimum cosine similarity for a hit
+            scope: Only entries stored under this scope are considered
+
+        Returns:
+            The cached payload, or None on a miss
+        """
+        if self._vectors is None or not self._entries:
+            return None
+
+        query = self._normalize(embedding)
+        if query is None or query.shape[0] != self._vectors.shape[1]:
+            return None
+
+        scores = self._vectors @ query
+        # Entries from other scopes must not shadow a match in this one
+        other = np.fromiter((entry[1] != scope for entry in self._entries), dtype=bool, count=len(self._entries))
+        scores[other] = -np.inf
+        best = int(np.argmax(scores))
+        expires_at, _, payload = self._entries[best]
+        if scores[best] < threshold or expires_at < time.time():
+            return None
+        return payload
+
+    def set(
+        self,
+        embedding: List[float],
+        payload: Dict[str, Any],
+        ttl: Optional[int] = None,
+        scope: Hashable = None
+    ):
+        """
+        Store a payload under the given embedding.
+
+        Args:
+            embedding: Query embedding the payload answers
+            payload: Serialized response to cache
+            ttl: Lifetime in seconds (defaults to the cache TTL)
+            scope: Scope the payload is valid in, matched by get()
+        """
+        vector = self._normalize(embedding)
+        if vector is None or self.max_entries <= 0:
+            return
+
+        now = time.time()
+        # Keep live entries from the same embedding model, oldest evicted first
+        keep = [i for i, (expires_at, _, _) in enumerate(self._entries) if expires_at > now]
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            keep = []
+        keep = keep[len(keep) - self.max_entries + 1:] if len(keep) >= self.max_entries else keep
+
+        rows = [self._vectors[keep]] if keep else []
+        self._vectors = np.vstack(rows + [vector[np.newaxis, :]])
+        self._entries = [self._entries[i] for i in keep]
+        self._entries.append((now + (self.ttl if ttl is None else ttl), scope, payload))
+
+    def clear(self):
+        """Drop every cached entry."""
+        self._vectors = None
+        self._entries = []
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache(
+    max_entries=settings.semantic_cache_max_entries,
+    ttl=settings.semantic_cache_ttl
+)
@@ -0,0 +1,31 @@
+-- int8-quantized copies of the embeddings, used by the Supabase client-side
+-- fallback in retrieve_similar_context when EMBEDDING_INT8=true.
+-- Each vector is stored as one signed byte per dimension (embedding_i8) with a
+-- per-vector scale (embedding_scale), so embedding ~= embedding_i8 * embedding_scale.
+
+ALTER TABLE embeddings
+    ADD COLUMN IF NOT EXISTS embedding_i8 bytea,
+    ADD COLUMN IF NOT EXISTS embedding_scale real;
+
+-- Backfill existing rows (new rows are quantized by ingest_texts)
+UPDATE embeddings e
+SET embedding_i8 = q.embedding_i8,
+    embedding_scale = q.embedding_scale
+FROM (
+    SELECT
+        emb.id,
+        s.scale AS embedding_scale,
+        decode(
+            string_agg(lpad(to_hex(round(v.x / s.scale)::int & 255), 2, '0'), '' ORDER BY v.ord),
+            'hex'
+        ) AS embedding_i8
+    FROM embeddings emb
+    CROSS JOIN LATERAL (
+        SELECT coalesce(nullif(max(abs(x)), 0) / 127, 1) AS scale
+        FROM unnest(emb.embedding::real[]) AS x
+    ) s
+    CROSS JOIN LATERAL unnest(emb.embedding::real[]) WITH ORDINALITY AS v(x, ord)
+    WHERE emb.embedding_i8 IS NULL
+    GROUP BY emb.id, s.scale
+) q
+WHERE e.id = q.id;
@@ -0,0 +1,7 @@
+-- Approximate nearest-neighbour index for retrieve_similar_context.
+-- The Postgres search orders by cosine distance (embedding <=> query), so the
+-- index must use vector_cosine_ops to be picked by the planner.
+-- Requires pgvector >= 0.5.0.
+
+CREATE INDEX IF NOT EXISTS embeddings_embedding_hnsw_idx
+    ON embeddings USING hnsw (embedding vector_cosine_ops);
@@ -0,0 +1,16 @@
+-- Rescale existing embeddings to unit length.
+-- ingest_texts stores unit vectors so the Supabase client-side fallback can rank
+-- rows by a plain dot product; rows ingested before that need this one-off pass.
+-- Requires pgvector >= 0.7.0 (l2_normalize).
+
+-- If scripts/add_embeddings_int8.sql was applied, keep embedding ~= embedding_i8 * embedding_scale
+-- (the int8 values themselves do not change when the vector is rescaled). Run this first:
+-- UPDATE embeddings
+-- SET embedding_scale = embedding_scale / vector_norm(embedding)
+-- WHERE embedding_scale IS NOT NULL AND vector_norm(embedding) > 0
+--     AND abs(vector_norm(embedding) - 1) > 1e-4;
+
+UPDATE embeddings
+SET embedding = l2_normalize(embedding)
+WHERE vector_norm(embedding) > 0
+    AND abs(vector_norm(embedding) - 1) > 1e-4;